@@ -0,0 +1,415 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+from config import flush_all as flush_config
+from scheduler import backup_scheduler
+from metrics import get_metrics_store
+from backups import valid_backup_name
+from metricsdb import metrics_db
+from status import ping_engine
+from datetime import datetime
+from servers import Server
+import ipaddress
+import threading
+import hmac
+import json
+import time
+import os
+
+SERVERS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "servers"))
+MAX_BODY = 64 * 1024  # Requests only carry small JSON documents
+
+# Console streams
+STREAM_QUEUE = 2000          # Lines queued per client before the oldest are dropped
+STREAM_KEEPALIVE = 15        # Seconds between keepalive comments on an idle stream
+STREAM_BATCH_DELAY = 0.05    # Minimum seconds between frames
+
+DAEMON_USAGE = "-daemon [port] [-host <host>] [-token <token>] [-autostart <server>]"
+
+STATUS_INTERVAL = 5  # Seconds between pings of all running servers
+
+
+class ApiError(Exception):
+    """Error that is sent to the client as {"error": message} with the given HTTP status"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ManagerDaemon:
+    """
+    Headless manager that controls every server through a local HTTP/JSON API.
+
+    One Server object is kept per server directory for the lifetime of the
+    daemon, so any number of servers can run and be scripted at the same time.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.servers = {}
+        self._lock = threading.Lock()
+        self.httpd = None
+
+    def server_names(self):
+        """Names of all server directories"""
+        os.makedirs(SERVERS_DIR, exist_ok=True)
+        return sorted(d for d in os.listdir(SERVERS_DIR) if os.path.isdir(os.path.join(SERVERS_DIR, d)))
+
+    def get_server(self, name):
+        """Get the Server object of an existing server directory"""
+        with self._lock:
+            if name not in self.servers:
+                if name not in self.server_names():
+                    raise ApiError(404, f"No such server: {name}")
+                self.servers[name] = Server(name)
+            return self.servers[name]
+
+    def describe(self, server):
+        """Short status of a server for listings"""
+        return {
+            "name": server.name,
+            "running": server.is_running(),
+            "uptime": server.get_uptime(),
+            "port": server.get_port(),
+            "players": len(server.get_players())
+        }
+
+    def serve_forever(self):
+        """Serve the API until interrupted, then stop every running server"""
+        self.httpd = ThreadingHTTPServer((self.host, self.port), ApiRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.manager = self
+        print(f"MCManager API listening on http://{self.host}:{self.port}")
+
+        # Scheduled backups run in the daemon too
+        for name in self.server_names():
+            self.get_server(name).schedule_next_backup()
+
+        threading.Thread(target=self._refresh_status, daemon=True).start()
+
+        try:
+            self.httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+
+    def _refresh_status(self):
+        """Ping every running server together, so status requests always find a fresh snapshot"""
+        while True:
+            started = time.time()
+            with self._lock:
+                running = [server for server in self.servers.values() if server.is_running()]
+            if running:
+                try:
+                    ping_engine.poll_all(running)
+                except Exception as e:
+                    print(f"Error pinging servers: {str(e)}")
+            time.sleep(max(0, STATUS_INTERVAL - (time.time() - started)))
+
+    def shutdown(self):
+        """Stop the running servers and write pending config and metrics"""
+        if self.httpd:
+            self.httpd.server_close()
+
+        running = [server for server in self.servers.values() if server.is_running()]
+        threads = [threading.Thread(target=server.stop) for server in running]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        flush_config()
+        metrics_db.flush()
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests to the daemon's servers"""
+
+    server_version = "MCManager"
+
+    def log_message(self, format, *args):
+        # Only log failed requests, status polling would flood the terminal otherwise
+        if len(args) > 1 and str(args[1]).startswith(("4", "5")):
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def _handle(self, method):
+        manager = self.server.manager
+        url = urlsplit(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.split("/") if part]
+
+        try:
+            # Clients have to prove they know the token if one is configured
+            if manager.token:
+                given = self.headers.get("Authorization", "").removeprefix("Bearer ")
+                # Bytes, compare_digest rejects non-ASCII str
+                if not hmac.compare_digest(given.encode('utf-8'), manager.token.encode('utf-8')):
+                    raise ApiError(401, "Invalid or missing token")
+
+            status, body = self._route(manager, method, parts)
+        except ApiError as e:
+            status, body = e.status, {"error": str(e)}
+        except Exception as e:
+            status, body = 500, {"error": str(e)}
+
+        if status is not None:
+            self._send_json(status, body)
+
+    def _route(self, manager, method, parts):
+        """Get (status, json body) for a request, (None, None) if the response was already sent"""
+        if parts == ["servers"] and method == "GET":
+            return 200, [manager.describe(manager.get_server(name)) for name in manager.server_names()]
+
+        if len(parts) < 2 or parts[0] != "servers":
+            raise ApiError(404, "Not found")
+
+        server = manager.get_server(parts[1])
+        action = parts[2] if len(parts) > 2 else None
+        route = (method, action)
+
+        if route == ("GET", None):
+            return 200, self._status(server)
+        if route == ("POST", "start"):
+            if not server.start():
+                raise ApiError(500, "Server failed to start, see the daemon's output")
+            return 200, {"running": True}
+        if route == ("POST", "stop"):
+            # Stopping waits for the server to save, don't hold the request that long
+            threading.Thread(target=server.stop, daemon=True).start()
+            return 202, {"stopping": True}
+        if route == ("POST", "restart"):
+            threading.Thread(target=server.restart, daemon=True).start()
+            return 202, {"restarting": True}
+        if route == ("POST", "command"):
+            command = self._read_json().get("command")
+            if not isinstance(command, str) or not command.strip():
+                raise ApiError(400, "Missing command")
+            if not server.is_running():
+                raise ApiError(409, "Server is not running")
+            try:
+                # Only this request waits for the pipe, and only up to a few seconds
+                server.submit_command(command.strip()).result(timeout=5)
+            except Exception as e:
+                raise ApiError(503, f"Command was not written: {str(e) or type(e).__name__}")
+            return 200, {"sent": True}
+        if route == ("GET", "console"):
+            if parts[3:] == ["stream"]:
+                self._stream_console(server)
+                return None, None
+            return 200, self._console(server)
+        if route == ("GET", "metrics"):
+            return 200, self._metrics(server)
+        if action == "backups":
+            return self._backups(server, method, parts[3] if len(parts) > 3 else None)
+
+        raise ApiError(404, "Not found")
+
+    def _status(self, server):
+        """Full status of one server"""
+        status = server.update_status()
+        return {
+            **self.server.manager.describe(server),
+            "cpu": server.cpu_usage,
+            "ram": server.ram_usage,
+            "max_ram": server.max_ram,
+            "player_list": server.get_players(),
+            "max_players": server.get_max_players(),
+            "version": status.get("version") if status else None,
+            "tps": server.tps,
+            "ready_time": server.ready_time,
+            "console_lines_per_second": server.flood_guard.lines_per_second,
+            "console_bytes_per_second": server.flood_guard.bytes_per_second,
+            "last_backup": server.last_backup,
+            "next_backup": backup_scheduler.next_backup(server)
+        }
+
+    def _console(self, server):
+        """Console lines after ?since= (a cursor from a previous response), up to ?limit= of the newest"""
+        since = self._int_param("since", 0)
+        limit = self._int_param("limit", 1000)
+
+        # ?q= searches the buffered lines instead, the newest matches come last
+        query = self.query.get("q")
+        if query:
+            return {"lines": [{"text": line.text, "plain": line.plain} for line in server.search_console(query, limit)]}
+
+        lines, cursor = server.get_console_since(since, limit)
+        first = cursor - len(lines)
+        return {
+            "cursor": cursor,
+            "lines": [
+                {"seq": first + i, "text": line.text, "plain": line.plain}
+                for i, line in enumerate(lines)
+            ]
+        }
+
+    def _stream_console(self, server):
+        """
+        Push console lines as Server-Sent Events until the client disconnects.
+
+        Every event is a batch: "id" is the last line's sequence number, so
+        EventSource reconnects resume through Last-Event-ID (or ?since=).
+        "dropped" counts lines lost because the client fell too far behind.
+        """
+        last_id = self.headers.get("Last-Event-ID")
+        since = int(last_id) + 1 if last_id and last_id.isdigit() else self.query.get("since")
+        try:
+            since = int(since) if since is not None else None
+        except ValueError:
+            raise ApiError(400, "since must be an integer")
+
+        # Subscribe before sending headers so a bad request still gets a JSON error
+        subscriber = server.subscribe_console(since, STREAM_QUEUE)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+
+            while True:
+                lines, dropped = subscriber.get(timeout=STREAM_KEEPALIVE)
+                if not lines and not dropped:
+                    # Comment line, keeps proxies from closing the idle connection
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+
+                frame = {
+                    "lines": [{"seq": seq, "text": line.text, "plain": line.plain} for seq, line in lines],
+                    "dropped": dropped
+                }
+                event_id = f"id: {lines[-1][0]}\n" if lines else ""
+                self.wfile.write(f"{event_id}event: lines\ndata: {json.dumps(frame)}\n\n".encode())
+                self.wfile.flush()
+
+                # Let lines pile up a bit so busy consoles are sent in few large frames
+                time.sleep(STREAM_BATCH_DELAY)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            server.unsubscribe_console(subscriber)
+            self.close_connection = True
+
+    def _metrics(self, server):
+        """Samples of ?metric= over the last ?seconds=, from memory or the database for older ranges"""
+        metric = self.query.get("metric", "cpu")
+        seconds = self._int_param("seconds", 3600)
+        store = get_metrics_store(server.name)
+        if metric not in store.SERIES:
+            raise ApiError(400, f"Unknown metric: {metric}")
+
+        resolution = store.resolution_for(seconds)
+        if store.series[metric].covers(resolution, seconds):
+            times, values = store.window(metric, seconds, resolution)
+            samples = list(zip(times.tolist(), values.tolist()))
+        else:
+            samples = metrics_db.query(server.name, metric, time.time() - seconds)
+        return {"metric": metric, "samples": samples}
+
+    def _backups(self, server, method, name):
+        """List, create and delete backups"""
+        if method == "GET" and name is None:
+            backups = server.get_backups()
+            for backup in backups:
+                backup.pop("path", None)  # Don't leak local paths to clients
+            return 200, backups
+        if method == "POST" and name is None:
+            name = self._read_json().get("name") or f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            if not valid_backup_name(name):
+                raise ApiError(400, "Backup names must be a plain file name")
+            # Retried requests would only queue up behind the running backup
+            if server.is_backing_up():
+                raise ApiError(409, "A backup of this server is already running")
+            # Backups can take minutes, clients poll GET backups for the result
+            threading.Thread(target=server.create_backup, args=(name,), daemon=True).start()
+            return 202, {"name": name, "creating": True}
+        if method == "DELETE" and name is not None:
+            if not valid_backup_name(name):
+                raise ApiError(400, "Backup names must be a plain file name")
+            if not server.delete_backup(name):
+                raise ApiError(404, f"No such backup: {name}")
+            return 200, {"deleted": True}
+        raise ApiError(404, "Not found")
+
+    def _int_param(self, name, default):
+        try:
+            return int(self.query.get(name, default))
+        except ValueError:
+            raise ApiError(400, f"{name} must be an integer")
+
+    def _read_json(self):
+        """Read the request body as a JSON object"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            raise ApiError(413, "Request body too large")
+        if not length:
+            return {}
+        try:
+            data = json.loads(self.rfile.read(length))
+        except ValueError:
+            raise ApiError(400, "Invalid JSON")
+        if not isinstance(data, dict):
+            raise ApiError(400, "Expected a JSON object")
+        return data
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False  # Hostnames could resolve to anything
+
+
+def _flag_value(args, flag, default=None):
+    """Value after a command line flag, exits with the usage if the flag is last"""
+    if flag not in args:
+        return default
+    index = args.index(flag)
+    if index + 1 >= len(args):
+        exit(f'Error: {flag} needs a value\nUsage: {DAEMON_USAGE}')
+    return args[index+1]
+
+
+def run_daemon(args):
+    """Run the API from command line flags, see DAEMON_USAGE"""
+    index = args.index('-daemon')
+    port = args[index+1] if len(args) > index+1 and not args[index+1].startswith('-') else "8765"
+    if not port.isdigit():
+        exit(f'Error: -daemon port must be a number\nUsage: {DAEMON_USAGE}')
+    port = int(port)
+    host = _flag_value(args, '-host', "127.0.0.1")
+    token = _flag_value(args, '-token', os.environ.get("MCMANAGER_TOKEN"))
+
+    # Anyone who can reach the port could run commands on the servers
+    if not token and not _is_loopback(host):
+        exit(f'Error: -host {host} is reachable from other machines, set -token or MCMANAGER_TOKEN')
+
+    manager = ManagerDaemon(host, port, token)
+    if '-autostart' in args:
+        try:
+            manager.get_server(_flag_value(args, '-autostart')).start()
+        except ApiError as e:
+            exit(f'Error: {e}')
+    manager.serve_forever()
@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+from backups import PRECOMPRESSED
+from collections import deque
+import struct
+import time
+import zlib
+import os
+
+BLOCK_SIZE = 1024 * 1024  # Bytes each worker deflates at a time
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+ZIP64_VERSION = 45
+UTF8_NAMES = 0x800
+
+
+def _deflate_block(data, level, final):
+    """Raw-deflate one block. Non-final blocks end on a byte boundary so the blocks join into one stream"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_FULL_FLUSH)
+
+
+def _dos_time(mtime):
+    t = time.localtime(max(mtime, 315532800))  # Zip can't go before 1980
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class _Member:
+    def __init__(self, name, method, mtime, mode, offset):
+        self.name = name.encode('utf-8')
+        self.method = method
+        self.time, self.date = _dos_time(mtime)
+        self.mode = mode
+        self.offset = offset
+        self.crc = 0
+        self.size = 0
+        self.compressed_size = 0
+
+    def local_header(self):
+        # Sizes always go in the ZIP64 extra field, so the header keeps its length when patched
+        extra = struct.pack('<HHQQ', 1, 16, self.size, self.compressed_size)
+        return struct.pack(
+            '<IHHHHHIIIHH',
+            0x04034b50,
+            ZIP64_VERSION,
+            UTF8_NAMES,
+            self.method,
+            self.time,
+            self.date,
+            self.crc,
+            0xFFFFFFFF,
+            0xFFFFFFFF,
+            len(self.name),
+            len(extra)
+        ) + self.name + extra
+
+    def central_header(self):
+        extra = struct.pack('<HHQQQ', 1, 24, self.size, self.compressed_size, self.offset)
+        return struct.pack(
+            '<IHHHHHHIIIHHHHHII',
+            0x02014b50,
+            (3 << 8) | ZIP64_VERSION,  # Made by Unix, so external attributes hold the file mode
+            ZIP64_VERSION,
+            UTF8_NAMES,
+            self.method,
+            self.time,
+            self.date,
+            self.crc,
+            0xFFFFFFFF,
+            0xFFFFFFFF,
+            len(self.name),
+            len(extra),
+            0,
+            0,
+            0,
+            (self.mode & 0xFFFF) << 16,
+            0xFFFFFFFF
+        ) + self.name + extra
+
+
+class ParallelZipWriter:
+    """
+    Zip archive writer that deflates on a thread pool.
+
+    The calling thread reads files in BLOCK_SIZE blocks and keeps the CRC,
+    workers deflate the blocks independently (zlib releases the GIL) and the
+    results are written back in order, the same trick pigz uses. Members
+    that are already compressed (jars, region files, ...) are stored as is.
+    """
+
+    def __init__(self, path, threads=None, level=6):
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+        self.path = path
+        # Only renamed to path once complete, so a failed backup never looks like a good archive
+        self._temp_path = f"{path}.tmp"
+        self._file = open(self._temp_path, 'wb')
+        self._pool = ThreadPoolExecutor(self.threads, thread_name_prefix="zip")
+        self._members = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.started = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def throughput(self):
+        """Input MB/s so far"""
+        return self.bytes_in / 1024 / 1024 / max(time.perf_counter() - self.started, 0.001)
+
+    def write(self, path, arcname):
+        """Add a file to the archive"""
+        stat = os.stat(path)
+        method = ZIP_STORED if path.lower().endswith(PRECOMPRESSED) else ZIP_DEFLATED
+        member = _Member(arcname.replace(os.sep, '/'), method, stat.st_mtime, stat.st_mode, self._file.tell())
+        self._file.write(member.local_header())
+
+        with open(path, 'rb') as f:
+            if method == ZIP_STORED:
+                while block := f.read(BLOCK_SIZE):
+                    member.crc = zlib.crc32(block, member.crc)
+                    member.size += len(block)
+                    self._file.write(block)
+                member.compressed_size = member.size
+            else:
+                self._write_deflated(f, member)
+
+        # Go back and fill in the CRC and sizes
+        end = self._file.tell()
+        self._file.seek(member.offset)
+        self._file.write(member.local_header())
+        self._file.seek(end)
+
+        self._members.append(member)
+        self.bytes_in += member.size
+        self.bytes_out += member.compressed_size
+
+    def _write_deflated(self, f, member):
+        in_flight = deque()
+        block = f.read(BLOCK_SIZE)
+        while True:
+            next_block = f.read(BLOCK_SIZE) if block else b""
+            member.crc = zlib.crc32(block, member.crc)
+            member.size += len(block)
+            in_flight.append(self._pool.submit(_deflate_block, block, self.level, not next_block))
+
+            # Bound the memory held by blocks waiting to be written
+            while len(in_flight) > self.threads * 2 or (in_flight and not next_block):
+                data = in_flight.popleft().result()
+                member.compressed_size += len(data)
+                self._file.write(data)
+
+            if not next_block:
+                return
+            block = next_block
+
+    def close(self):
+        """Write the central directory and close the archive"""
+        if self._file.closed:
+            return
+        self._pool.shutdown()
+
+        directory_offset = self._file.tell()
+        for member in self._members:
+            self._file.write(member.central_header())
+        directory_size = self._file.tell() - directory_offset
+        count = len(self._members)
+
+        # ZIP64 end of central directory record and locator, then the classic end record
+        zip64_offset = self._file.tell()
+        self._file.write(struct.pack(
+            '<IQHHIIQQQQ',
+            0x06064b50,
+            44,
+            ZIP64_VERSION,
+            ZIP64_VERSION,
+            0,
+            0,
+            count,
+            count,
+            directory_size,
+            directory_offset
+        ))
+        self._file.write(struct.pack('<IIQI', 0x07064b50, 0, zip64_offset, 1))
+        self._file.write(struct.pack(
+            '<IHHHHIIH',
+            0x06054b50,
+            0,
+            0,
+            min(count, 0xFFFF),
+            min(count, 0xFFFF),
+            min(directory_size, 0xFFFFFFFF),
+            min(directory_offset, 0xFFFFFFFF),
+            0
+        ))
+        self._file.close()
+        os.replace(self._temp_path, self.path)
+
+    def abort(self):
+        """Throw away the unfinished archive"""
+        if self._file.closed:
+            return
+        self._pool.shutdown(cancel_futures=True)
+        self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except OSError:
+            pass
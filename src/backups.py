@@ -0,0 +1,479 @@
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import threading
+import tempfile
+import hashlib
+import shutil
+import struct
+import json
+import time
+import zlib
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+CHUNK_SIZE = 1024 * 1024  # Files are split into chunks of this many bytes
+
+# Already compressed data doesn't get smaller, so chunks of these are stored as is
+PRECOMPRESSED = ('.jar', '.zip', '.gz', '.xz', '.bz2', '.png', '.jpg', '.ogg', '.mca', '.mcc')
+
+# Region (.mca) files: 4 KiB sectors, an 8 KiB header of 1024 chunk locations and 1024 chunk timestamps
+SECTOR = 4096
+REGION_HEADER = 2 * SECTOR
+
+FICLONE = 0x40049409  # Linux ioctl that makes a file share another's extents (btrfs, XFS, ...)
+
+# The server replaces these instead of writing into them, so a hard link is as good as a copy
+IMMUTABLE = ('.jar',)
+
+# First byte of a stored chunk
+_RAW = b'R'
+_ZLIB = b'Z'
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def _store_lock(path):
+    """One lock per store, so garbage collection never runs while a backup adds chunks"""
+    with _locks_lock:
+        return _locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+class BackupStore:
+    """
+    Content-addressed, deduplicating backup store.
+
+    Files are split into CHUNK_SIZE chunks that are stored once under their
+    sha256 in chunks/. A backup is just a manifest listing every file and its
+    chunk hashes, so a backup only costs the chunks that changed. Files whose
+    size and mtime match the previous backup aren't even read again. Deleting
+    a backup removes the chunks no other manifest references.
+
+    With region_aware, region files are stored as their header plus one blob
+    per Minecraft chunk, and chunks whose header timestamp didn't change since
+    the previous backup are reused without being read.
+    """
+
+    def __init__(self, backups_dir, compression_level=6, region_aware=True, threads=None):
+        self.backups_dir = backups_dir
+        self.chunks_dir = os.path.join(backups_dir, "chunks")
+        self.compression_level = compression_level
+        self.threads = threads or os.cpu_count() or 1  # Chunks hashed and compressed at once
+        self.region_aware = region_aware  # Store .mca files as header + changed Minecraft chunks
+        self._lock = _store_lock(backups_dir)
+
+    # Manifests
+    def _manifest_path(self, name):
+        return os.path.join(self.backups_dir, f"{name}.manifest.json")
+
+    def exists(self, name):
+        return os.path.exists(self._manifest_path(name))
+
+    def load_manifest(self, name):
+        with open(self._manifest_path(name), 'r') as f:
+            return json.load(f)
+
+    def _write_manifest(self, manifest):
+        fd, temp_path = tempfile.mkstemp(prefix=".manifest.", dir=self.backups_dir)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self._manifest_path(manifest["name"]))
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def names(self):
+        """Names of all backups in the store, oldest first"""
+        if not os.path.isdir(self.backups_dir):
+            return []
+        names = [
+            (os.path.getmtime(os.path.join(self.backups_dir, file)), file.removesuffix(".manifest.json"))
+            for file in os.listdir(self.backups_dir)
+            if file.endswith(".manifest.json")
+        ]
+        return [name for _, name in sorted(names)]
+
+    def list(self):
+        """Backups as dicts like Server.get_backups() returns"""
+        backups = []
+        for name in self.names():
+            try:
+                manifest = self.load_manifest(name)
+            except Exception as e:
+                print(f"Skipping unreadable backup manifest {name}: {str(e)}")
+                continue
+            backups.append({
+                "name": name,
+                "path": self._manifest_path(name),
+                "size": manifest.get("size", 0),    # Size of the backed up files
+                "added": manifest.get("added", 0),  # Bytes this backup added to the store
+                "timestamp": manifest.get("created", 0),
+                "type": "dedup"
+            })
+        return backups
+
+    # Chunks
+    def _chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def _put_chunk(self, data, compress=True):
+        """Store a chunk unless it's already there, returns (hash, bytes written)"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._chunk_path(digest)
+        if os.path.exists(path):
+            return digest, 0
+
+        stored = _ZLIB + zlib.compress(data, self.compression_level) if compress else _RAW + data
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix=".chunk.", dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as f:
+            f.write(stored)
+        os.replace(temp_path, path)
+        return digest, len(stored)
+
+    def read_chunk(self, digest):
+        with open(self._chunk_path(digest), 'rb') as f:
+            stored = f.read()
+        return zlib.decompress(stored[1:]) if stored[:1] == _ZLIB else stored[1:]
+
+    # Backups
+    def previous_files(self):
+        """File entries of the newest backup by path and when it started, ({}, 0) if there is none"""
+        names = self.names()
+        if not names:
+            return {}, 0
+        try:
+            manifest = self.load_manifest(names[-1])
+            return {entry["path"]: entry for entry in manifest["files"]}, manifest.get("started", 0)
+        except Exception as e:
+            print(f"Could not read the previous backup, backing up everything: {str(e)}")
+            return {}, 0
+
+    def create(self, name, source_dir, exclude=("backups",), files=None, started=None):
+        """
+        Back up source_dir (minus the excluded top level entries) and return the manifest.
+
+        files can be a snapshot_files() list to back up instead of walking
+        source_dir, started is then when the snapshot was taken.
+        """
+        with self._lock:
+            os.makedirs(self.backups_dir, exist_ok=True)
+
+            started = started or time.time()
+
+            # Unchanged files just reuse their chunk list from the newest backup
+            previous, previous_started = self.previous_files()
+
+            entries = []
+            size = added = 0
+            # hashlib and zlib release the GIL, so chunks of big files are processed in parallel
+            with ThreadPoolExecutor(self.threads, thread_name_prefix="backup") as self._pool:
+                for path, rel_path, stat in walk_files(source_dir, exclude) if files is None else files:
+                    entry = {"path": rel_path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "mode": stat.st_mode & 0o777}
+
+                    old = previous.get(rel_path)
+                    if unchanged(old, stat):
+                        for key in ("chunks", "region"):
+                            if key in old:
+                                entry[key] = old[key]
+                    else:
+                        try:
+                            region = None
+                            if self.region_aware and rel_path.endswith(".mca"):
+                                region = self._store_region(path, stat.st_size, old, previous_started)
+                            if region:
+                                entry["region"], written = region
+                            else:
+                                entry["chunks"], written = self._store_file(path)
+                        except OSError as e:
+                            # e.g. files the running server keeps locked on Windows
+                            print(f"Skipping {rel_path}: {str(e)}")
+                            continue
+                        added += written
+
+                    entries.append(entry)
+                    size += stat.st_size
+
+            manifest = {
+                "version": 1,
+                "name": name,
+                "started": started,
+                "created": time.time(),
+                "size": size,
+                "added": added,
+                "files": entries
+            }
+            self._write_manifest(manifest)
+            return manifest
+
+    def _store_file(self, path):
+        """Store a file's chunks, returns (chunk hashes, bytes written)"""
+        compress = not path.lower().endswith(PRECOMPRESSED)
+        chunks = []
+        written = 0
+        in_flight = deque()
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(CHUNK_SIZE)
+                if data:
+                    in_flight.append(self._pool.submit(self._put_chunk, data, compress))
+
+                # Keep the order of the chunks and only a few of them in memory
+                while in_flight and (len(in_flight) > self.threads * 2 or not data):
+                    digest, count = in_flight.popleft().result()
+                    chunks.append(digest)
+                    written += count
+                if not data:
+                    return chunks, written
+
+    def _store_region(self, path, size, old_entry, since):
+        """
+        Store a region file as its header plus the Minecraft chunks that changed.
+
+        A chunk whose header timestamp matches the previous backup, and is
+        older than when that backup started, reuses the stored copy unread.
+
+        Returns:
+            tuple: ({"header", "chunks"}, bytes written), or None if the file doesn't look like a region file
+        """
+        old_chunks = (old_entry or {}).get("region", {}).get("chunks", {})
+        with open(path, 'rb') as f:
+            header = f.read(REGION_HEADER)
+            if len(header) < REGION_HEADER:
+                return None
+            locations = struct.unpack('>1024I', header[:SECTOR])
+            timestamps = struct.unpack('>1024I', header[SECTOR:])
+
+            # Check every location first so a corrupt file falls back to plain chunking
+            for location in locations:
+                offset, sectors = location >> 8, location & 0xFF
+                if offset and (offset < 2 or (offset + sectors) * SECTOR > size):
+                    return None
+
+            header_hash, written = self._put_chunk(header)
+            chunks = {}
+            for index, location in enumerate(locations):
+                offset, sectors = location >> 8, location & 0xFF
+                if not offset:
+                    continue
+
+                key = str(index)  # JSON object keys are strings
+                old = old_chunks.get(key)
+                if old and old[0] == timestamps[index] and timestamps[index] < since - 1:
+                    chunks[key] = old
+                    continue
+
+                f.seek(offset * SECTOR)
+                data = f.read(sectors * SECTOR)
+                # Only keep the chunk's own bytes, not the rest of its last sector
+                length = int.from_bytes(data[:4], 'big')
+                if 0 < length <= len(data) - 4:
+                    data = data[:4 + length]
+
+                # Chunk payloads are already zlib/gzip/lz4 compressed
+                digest, count = self._put_chunk(data, compress=False)
+                chunks[key] = [timestamps[index], digest]
+                written += count
+
+        return {"header": header_hash, "chunks": chunks}, written
+
+    def restore(self, name, target_dir):
+        """Write every file of a backup into target_dir"""
+        manifest = self.load_manifest(name)
+        for entry in manifest["files"]:
+            path = os.path.join(target_dir, entry["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                if "region" in entry:
+                    self._restore_region(f, entry)
+                else:
+                    for digest in entry["chunks"]:
+                        f.write(self.read_chunk(digest))
+            os.chmod(path, entry.get("mode", 0o644))
+            os.utime(path, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    def _restore_region(self, f, entry):
+        """Put a region file back together from its header and chunks"""
+        header = self.read_chunk(entry["region"]["header"])
+        locations = struct.unpack('>1024I', header[:SECTOR])
+
+        f.write(header)
+        for index, (_, digest) in entry["region"]["chunks"].items():
+            f.seek((locations[int(index)] >> 8) * SECTOR)
+            f.write(self.read_chunk(digest))
+        # Unused sectors come back as zeros
+        f.truncate(entry["size"])
+
+    def delete(self, name):
+        """Delete a backup and the chunks only it used"""
+        with self._lock:
+            try:
+                os.remove(self._manifest_path(name))
+            except FileNotFoundError:
+                return False
+            self.collect_garbage()
+            return True
+
+    def collect_garbage(self):
+        """Remove chunks no manifest references, returns how many were removed"""
+        with self._lock:
+            referenced = set()
+            for name in self.names():
+                for entry in self.load_manifest(name)["files"]:
+                    referenced.update(_entry_hashes(entry))
+
+            removed = 0
+            if not os.path.isdir(self.chunks_dir):
+                return removed
+            for prefix in os.listdir(self.chunks_dir):
+                prefix_dir = os.path.join(self.chunks_dir, prefix)
+                for digest in os.listdir(prefix_dir):
+                    if digest not in referenced:
+                        os.remove(os.path.join(prefix_dir, digest))
+                        removed += 1
+                if not os.listdir(prefix_dir):
+                    shutil.rmtree(prefix_dir, ignore_errors=True)
+            return removed
+
+
+def _entry_hashes(entry):
+    """All chunk hashes a manifest file entry uses"""
+    if "region" in entry:
+        return [entry["region"]["header"], *(digest for _, digest in entry["region"]["chunks"].values())]
+    return entry["chunks"]
+
+
+def valid_backup_name(name):
+    """Whether name is a single plain file name, so it can't point outside the backups directory"""
+    return (
+        isinstance(name, str)
+        and bool(name)
+        and not name.startswith('.')  # Also rules out ".", ".." and clashes with .snapshot-* dirs
+        and not any(char in name for char in '/\\:\0')
+    )
+
+
+def unchanged(entry, stat):
+    """Whether a file still has the size and mtime a manifest entry recorded"""
+    return bool(entry) and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+
+def walk_files(source_dir, exclude=()):
+    """Yield (path, relative path, stat) of every regular file, skipping excluded top level entries"""
+    for root, dirs, files in os.walk(source_dir):
+        if root == source_dir:
+            dirs[:] = [d for d in dirs if d not in exclude]
+            files = [f for f in files if f not in exclude]
+        for file in files:
+            path = os.path.join(root, file)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            # Manifests always use forward slashes so backups move between platforms
+            yield path, os.path.relpath(path, source_dir).replace(os.sep, '/'), stat
+
+
+def clone_file(src, dst):
+    """
+    Copy a file as cheaply as the filesystem allows.
+
+    Tries a reflink (the copy shares the original's blocks until either is
+    written), then an in-kernel copy_file_range, then a plain copy. Immutable
+    files are hard linked instead.
+
+    Returns:
+        str: "link", "reflink", "range" or "copy"
+    """
+    if src.lower().endswith(IMMUTABLE):
+        try:
+            os.link(src, dst)
+            return "link"
+        except OSError:
+            pass
+
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        method = "copy"
+        if fcntl:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                method = "reflink"
+            except OSError:
+                pass
+
+        if method == "copy" and hasattr(os, 'copy_file_range'):
+            try:
+                while os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30):
+                    pass
+                method = "range"
+            except OSError:
+                # Not supported between these filesystems, start over
+                fsrc.seek(0)
+                fdst.seek(0)
+                fdst.truncate()
+
+        if method == "copy":
+            shutil.copyfileobj(fsrc, fdst, CHUNK_SIZE)
+
+    shutil.copystat(src, dst)
+    return method
+
+
+def snapshot_files(source_dir, snapshot_dir, exclude=(), skip=None, earlier=None):
+    """
+    Capture source_dir into snapshot_dir so it can be backed up while the server keeps writing.
+
+    Files for which skip(relative path, stat) is true aren't copied and keep
+    their path in source_dir, for files the backup won't read anyway.
+
+    earlier is the result of a previous pass into the same snapshot_dir.
+    Its copies are kept for files that haven't changed since, so a second
+    pass only copies what was written in the meantime.
+
+    Returns:
+        tuple: (files, methods, started) where files is a (path, relative path, stat) list like
+        walk_files yields and methods counts the files per clone_file method ("kept" for reused copies)
+    """
+    started = time.time()
+    copies = {}
+    earlier_started = 0
+    if earlier:
+        earlier_files, _, earlier_started = earlier
+        copies = {rel_path: (path, stat) for path, rel_path, stat in earlier_files if path.startswith(snapshot_dir)}
+
+    files = []
+    methods = {}
+    for path, rel_path, stat in walk_files(source_dir, exclude):
+        if skip and skip(rel_path, stat):
+            files.append((path, rel_path, stat))
+            continue
+
+        copy_path = os.path.join(snapshot_dir, rel_path)
+        copy = copies.get(rel_path)
+        # A write within the same timestamp tick as the earlier stat wouldn't show, so recent files are copied again
+        if copy and (copy[1].st_size, copy[1].st_mtime_ns) == (stat.st_size, stat.st_mtime_ns) and stat.st_mtime < earlier_started - 1:
+            methods["kept"] = methods.get("kept", 0) + 1
+            files.append((copy_path, rel_path, stat))
+            continue
+
+        os.makedirs(os.path.dirname(copy_path), exist_ok=True)
+        try:
+            if os.path.exists(copy_path):
+                os.remove(copy_path)  # Never write through a hard link from the earlier pass
+            method = clone_file(path, copy_path)
+        except OSError as e:
+            print(f"Skipping {rel_path}: {str(e)}")
+            continue
+        methods[method] = methods.get(method, 0) + 1
+        files.append((copy_path, rel_path, stat))
+    return files, methods, started
@@ -0,0 +1,144 @@
+import customtkinter as tki
+import numpy as np
+import tkinter
+
+# Dark theme colors
+BG_COLOR = "#2b2b2b"
+GRID_COLOR = "#3f3f3f"
+TEXT_COLOR = "#dcddde"
+
+
+class BlitChart:
+    """
+    Small matplotlib line chart for the dashboard.
+
+    The axes are only redrawn when their limits change. Otherwise the saved
+    background is restored and just the line artist is blitted on top.
+    Must only be used from the Tk thread.
+    """
+
+    def __init__(self, master, color, figsize=(3, 2)):
+        # Imported here so matplotlib is only loaded when someone asks for these charts
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+
+        # Figure instead of pyplot so charts are not kept alive by pyplot's figure manager
+        self.fig = Figure(figsize=figsize)
+        self.ax = self.fig.add_subplot()
+        self.canvas = FigureCanvasTkAgg(self.fig, master=master)
+        self.canvas.get_tk_widget().pack(
+            fill=tki.BOTH,
+            expand=True,
+            padx=5,
+            pady=5
+        )
+
+        # Style the plot
+        self.fig.patch.set_facecolor(BG_COLOR)
+        self.ax.set_facecolor(BG_COLOR)
+        self.ax.tick_params(
+            axis='both',
+            colors=TEXT_COLOR,
+            labelsize=7
+        )
+        self.ax.xaxis.label.set_color(TEXT_COLOR)
+        self.ax.yaxis.label.set_color(TEXT_COLOR)
+        for spine in self.ax.spines.values():
+            spine.set_color(GRID_COLOR)
+
+        # Animated artists are skipped by full draws, we blit them ourselves
+        self.line, = self.ax.plot(
+            [],
+            [],
+            '-',
+            color=color,
+            linewidth=1.5,
+            animated=True
+        )
+
+        self._background = None
+        self._limits = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        """Grab the freshly drawn axes as background and put the line back on top"""
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        # The canvas pushes the whole figure to Tk right after this event
+        self.ax.draw_artist(self.line)
+
+    def update(self, x, y, xlim, ylim):
+        """Show new data, only doing a full redraw if the axis limits changed"""
+        self.line.set_data(x, y)
+
+        limits = (tuple(xlim), tuple(ylim))
+        if limits != self._limits or self._background is None:
+            self._limits = limits
+            self.ax.set_xlim(*xlim)
+            self.ax.set_ylim(*ylim)
+            self.canvas.draw()  # Triggers _on_draw
+            return
+
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+
+class SparklineChart:
+    """
+    Lightweight line chart drawn straight on a Tk Canvas.
+
+    Same update() interface as BlitChart, but the single polyline just gets its
+    coordinates replaced, so there is no matplotlib import or figure rendering.
+    """
+
+    def __init__(self, master, color, height=150):
+        self.canvas = tkinter.Canvas(
+            master,
+            bg=BG_COLOR,
+            height=height,
+            highlightthickness=0
+        )
+        self.canvas.pack(
+            fill=tki.BOTH,
+            expand=True,
+            padx=5,
+            pady=5
+        )
+
+        self.border = self.canvas.create_rectangle(0, 0, 0, 0, outline=GRID_COLOR)
+        self.max_label = self.canvas.create_text(4, 2, anchor="nw", fill=TEXT_COLOR, font=("TkDefaultFont", 7))
+        self.line = self.canvas.create_line(0, 0, 0, 0, fill=color, width=1.5, state="hidden")
+
+        self._data = None
+        self.canvas.bind("<Configure>", lambda event: self._redraw())
+
+    def update(self, x, y, xlim, ylim):
+        """Show new data"""
+        self._data = (np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64), xlim, ylim)
+        self._redraw()
+
+    def _redraw(self):
+        """Map the data to canvas pixels and move the polyline"""
+        width = self.canvas.winfo_width()
+        height = self.canvas.winfo_height()
+        if self._data is None or width < 2 or height < 2:
+            return
+
+        x, y, (x_min, x_max), (y_min, y_max) = self._data
+        self.canvas.coords(self.border, 0, 0, width - 1, height - 1)
+        self.canvas.itemconfigure(self.max_label, text=f"{y_max:g}")
+
+        if len(x) < 2:
+            self.canvas.itemconfigure(self.line, state="hidden")
+            return
+
+        # No point in more vertices than horizontal pixels
+        if len(x) > width:
+            index = np.linspace(0, len(x) - 1, width).astype(np.int64)
+            x, y = x[index], y[index]
+
+        px = (x - x_min) / ((x_max - x_min) or 1) * (width - 1)
+        py = (height - 1) - (np.clip(y, y_min, y_max) - y_min) / ((y_max - y_min) or 1) * (height - 1)
+
+        self.canvas.coords(self.line, np.column_stack((px, py)).ravel().tolist())
+        self.canvas.itemconfigure(self.line, state="normal")
@@ -0,0 +1,100 @@
+from concurrent.futures import Future
+import threading
+import queue
+import time
+
+
+class CommandQueueFull(Exception):
+    """Too many commands are waiting to be written"""
+
+
+class CommandWriter:
+    """
+    Writes console commands to a server's binary stdin from its own thread.
+
+    Callers only put commands on a bounded queue and get a Future back, so a
+    full pipe never blocks them. Commands that are waiting together are
+    written and flushed in one go, optionally limited to rate per second.
+    """
+
+    def __init__(self, stream, maxsize=1000, rate=None, batch=64):
+        self.stream = stream
+        self.rate = rate    # Commands per second, None for no limit
+        self.batch = batch  # Most commands written with one flush
+        self._queue = queue.Queue(maxsize)
+        self._error = None  # Set once writing failed, later commands fail right away
+        self._closing = False  # close() was reached in the queue, stop after the current batch
+        self._closed = False   # close() was called, stop once the queue is empty even without the sentinel
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, command:str):
+        """Queue a command, the future's result is True once it was written"""
+        future = Future()
+        if self._error or self._closed:
+            future.set_exception(self._error or BrokenPipeError("Command writer closed"))
+            return future
+        try:
+            self._queue.put_nowait((command, future))
+        except queue.Full:
+            future.set_exception(CommandQueueFull(f"{self._queue.maxsize} commands are already waiting"))
+        return future
+
+    def close(self):
+        """Stop the writer thread after the queued commands"""
+        self._closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass  # No room for the sentinel, the writer stops once it emptied the queue
+
+    def _take_batch(self):
+        """Wait for a command and take whatever else is already waiting, None when closed"""
+        if self._closing or (self._closed and self._queue.empty()):
+            return None
+        item = self._queue.get()
+        if item is None:
+            return None
+
+        items = [item]
+        limit = self.batch if self.rate is None else max(1, min(self.batch, int(self.rate)))
+        while len(items) < limit:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # Write what we have, then stop on the next round
+                self._closing = True
+                break
+            items.append(item)
+        return items
+
+    def _run(self):
+        while True:
+            items = self._take_batch()
+            if items is None:
+                return
+
+            if self._error:
+                for _, future in items:
+                    future.set_exception(self._error)
+                continue
+
+            started = time.monotonic()
+            try:
+                self.stream.write("".join(f"{command}\n" for command, _ in items).encode('utf-8'))
+                self.stream.flush()
+            except Exception as e:
+                print(f"Failed to send command: {str(e)}")
+                self._error = e
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+
+            for _, future in items:
+                future.set_result(True)
+
+            # Spread batches out so the average stays at rate commands per second
+            if self.rate:
+                time.sleep(max(0, len(items) / self.rate - (time.monotonic() - started)))
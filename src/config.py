@@ -0,0 +1,175 @@
+import threading
+import tempfile
+import copy
+import json
+import os
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_config_store(path, delay=0.5):
+    """Get the shared ConfigStore of a config file, so every Server object of a server uses the same one"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = ConfigStore(path, delay)
+        return _stores[path]
+
+
+def flush_all():
+    """Write every pending config change now (call before exiting)"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        store.flush()
+
+
+class ConfigStore:
+    """
+    In-memory copy of a server_config.json.
+
+    Reads come from memory and the file is only re-read when its mtime or size
+    changes. Writes are debounced for delay seconds, so several settings saved
+    in a row end up as one atomic temp-file rename.
+    """
+
+    def __init__(self, path, delay=0.5):
+        self.path = path
+        self.delay = delay
+        self._data = {}
+        self._stamp = None  # (mtime_ns, size) of the version we loaded or wrote
+        self._dirty = False
+        self._timer = None
+        self._lock = threading.RLock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        """Re-read the file if someone else changed it, unless we have unsaved changes"""
+        if self._dirty:
+            return
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+
+        data = {}
+        if stamp is not None:
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Error reading server config: {str(e)}")
+
+        self._data = data if isinstance(data, dict) else {}
+        self._stamp = stamp
+
+    def exists(self):
+        """Check if the config exists on disk or has pending changes"""
+        with self._lock:
+            return self._dirty or self._file_stamp() is not None
+
+    def get(self, key, default=None):
+        """Get a copy of a top level value"""
+        with self._lock:
+            self._reload_if_changed()
+            return copy.deepcopy(self._data.get(key, default))
+
+    def data(self):
+        """Get a copy of the whole document"""
+        with self._lock:
+            self._reload_if_changed()
+            return copy.deepcopy(self._data)
+
+    def set(self, key, value):
+        """Set a top level value, written to disk after the debounce delay"""
+        self.update({key: value})
+
+    def update(self, values:dict):
+        """Set several top level values, written to disk after the debounce delay"""
+        with self._lock:
+            self._reload_if_changed()
+            self._data.update(copy.deepcopy(values))
+            self._dirty = True
+
+            # Restart the debounce timer
+            if self._timer:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write pending changes now"""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+
+            fd, temp_path = tempfile.mkstemp(prefix=".server_config.", dir=os.path.dirname(self.path))
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._data, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.path)
+            except Exception as e:
+                print(f"Failed to save server config: {str(e)}")
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                return
+
+            self._dirty = False
+            self._stamp = self._file_stamp()
+
+    # Typed accessors
+    def section(self, name):
+        """Get a settings section (general, world, advanced, ...) as a dict"""
+        value = self.get(name)
+        return value if isinstance(value, dict) else {}
+
+    @property
+    def memory(self):
+        """Memory allocation in MB, None if not configured"""
+        # Settings tab saves it under advanced, the creation wizard at the top level
+        memory = self.section("advanced").get("memory", self.get("memory"))
+        try:
+            return int(memory) if memory is not None else None
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def java_path(self):
+        """Custom Java executable, None if not configured"""
+        return self.get("java_path") or None
+
+    @property
+    def backup_schedule(self):
+        """Backup schedule as {"enabled", "interval" (hours), "max_backups", optional "retention"}"""
+        schedule = self.get("backup_schedule")
+        if isinstance(schedule, dict):
+            return schedule
+
+        # Servers made by the creation wizard only have the "backup" section
+        backup = self.section("backup")
+        max_backups = backup.get("max_backups", 10)
+        return {
+            "enabled": bool(backup.get("enabled", False)),
+            "interval": backup.get("frequency", 24),
+            # The wizard saves the combo box text, "All" meaning no limit
+            "max_backups": int(max_backups) if str(max_backups).isdigit() else -1
+        }
+
+    @property
+    def optimizations(self):
+        """Saved optimization settings, None if never saved"""
+        return self.get("optimizations")
@@ -0,0 +1,330 @@
+from collections import deque
+from typing import NamedTuple
+import functools
+import threading
+import html
+import time
+import re
+
+# Matches SGR escape sequences like \033[0;31m
+ANSI_PATTERN = re.compile(r'\033\[([\d;]*)m')
+
+# Map ANSI codes to console tag names
+ANSI_CODE_MAP = {
+    '31': "red",
+    '32': "green",
+    '33': "yellow",
+    '34': "blue",
+    '35': "magenta",
+    '36': "cyan",
+    '37': "white",
+    '91': "bright_red",
+    '92': "bright_green",
+    '93': "bright_yellow",
+    '94': "bright_blue",
+    '95': "bright_magenta",
+    '96': "bright_cyan",
+    '97': "bright_white"
+}
+
+# Colors of the console tag names, shared by the console view and exports
+TAG_COLORS = {
+    "red": "red",
+    "green": "green",
+    "yellow": "yellow",
+    "blue": "blue",
+    "magenta": "magenta",
+    "cyan": "cyan",
+    "white": "white",
+    "bright_red": "#ff5555",
+    "bright_green": "#55ff55",
+    "bright_yellow": "#ffff55",
+    "bright_blue": "#5555ff",
+    "bright_magenta": "#ff55ff",
+    "bright_cyan": "#55ffff",
+    "bright_white": "#ffffff"
+}
+
+
+class ConsoleLine(NamedTuple):
+    """A console line tokenized once when it was read"""
+    text: str    # Raw line including ANSI codes
+    plain: str   # Line with ANSI codes stripped
+    spans: tuple # ((text, style), ...), style is a tag name, "#rrggbb" or None
+
+
+@functools.lru_cache(maxsize=256)
+def _style_for_code(code, current):
+    """Get the style an ANSI code switches to"""
+    # Compound codes like 0;31;1 or 1;38;2;255;0;0 apply left to right
+    parts = code.split(';')
+    index = 0
+    while index < len(parts):
+        part = parts[index]
+        if part in ('38', '48') and index + 1 < len(parts):
+            if parts[index + 1] == '2':  # RGB color, only the foreground is shown
+                try:
+                    r, g, b = (int(value) for value in parts[index + 2:index + 5])
+                    if part == '38':
+                        current = f"#{r:02x}{g:02x}{b:02x}"
+                except ValueError:  # Fewer than 3 values or not numbers
+                    pass
+                index += 5
+                continue
+            if parts[index + 1] == '5':  # 256 color palette, skipped with its index
+                index += 3
+                continue
+        if part == '0' or part == '':
+            current = None
+        elif part in ANSI_CODE_MAP:
+            current = ANSI_CODE_MAP[part]
+        index += 1
+    return current
+
+
+def parse_ansi(line:str):
+    """Split a line into (text, style) spans"""
+    spans = []
+    current_pos = 0
+    current_style = None
+
+    for match in ANSI_PATTERN.finditer(line):
+        # Text before the ANSI code keeps the previous style
+        if match.start() > current_pos:
+            spans.append((line[current_pos:match.start()], current_style))
+
+        current_style = _style_for_code(match.group(1), current_style)
+        current_pos = match.end()
+
+    # Any remaining text
+    if current_pos < len(line):
+        spans.append((line[current_pos:], current_style))
+
+    plain = ''.join(text for text, _ in spans)
+    return ConsoleLine(line, plain, tuple(spans))
+
+
+def export_lines(lines, path:str):
+    """Write console lines to path, as colored HTML built from their spans if it ends in .html, else as plain text"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if not path.lower().endswith(('.html', '.htm')):
+            for line in lines:
+                f.write(f"{line.plain}\n")
+            return
+
+        f.write('<!DOCTYPE html>\n<meta charset="utf-8">\n<pre style="background:#1e1e1e;color:#dcdcdc">\n')
+        for line in lines:
+            for text, style in line.spans:
+                text = html.escape(text)
+                if style is None:
+                    f.write(text)
+                else:
+                    f.write(f'<span style="color:{TAG_COLORS.get(style, style)}">{text}</span>')
+            f.write("\n")
+        f.write("</pre>\n")
+
+
+class FloodGuard:
+    """
+    Per-server console throughput accounting and duplicate line collapsing.
+
+    Runs of identical lines are stored once, followed by a "repeated N times"
+    line when the run ends, or every summary_interval seconds while it lasts.
+    flush_idle() reports a run that ended without another line following it.
+    """
+
+    def __init__(self, summary_interval=1.0):
+        self.summary_interval = summary_interval
+        self._lines_per_second = 0.0
+        self._bytes_per_second = 0.0
+        self._window_start = time.monotonic()
+        self._window_lines = 0
+        self._window_bytes = 0
+        self._last = None       # Raw text of the last stored line
+        self._repeats = 0       # Repeats of _last that aren't in a summary yet
+        self._run_start = 0.0   # When _last was stored or last summarized
+        self._last_time = 0.0   # When the last line of any kind arrived
+        self._lock = threading.Lock()  # flush_idle() comes from a timer, not the reader
+
+    @property
+    def lines_per_second(self):
+        return self._lines_per_second if time.monotonic() - self._window_start < 2 else 0.0
+
+    @property
+    def bytes_per_second(self):
+        return self._bytes_per_second if time.monotonic() - self._window_start < 2 else 0.0
+
+    def check(self, line:str):
+        """
+        Count a line and decide if it should be stored.
+
+        Returns:
+            tuple: (store, summary) where store is False for a repeat of the previous line
+            and summary is a "repeated" line to store first, or None
+        """
+        with self._lock:
+            return self._check(line)
+
+    def _check(self, line):
+        now = time.monotonic()
+        self._last_time = now
+        self._window_lines += 1
+        self._window_bytes += len(line) + 1
+        elapsed = now - self._window_start
+        if elapsed >= 1:
+            self._lines_per_second = self._window_lines / elapsed
+            self._bytes_per_second = self._window_bytes / elapsed
+            self._window_start = now
+            self._window_lines = self._window_bytes = 0
+
+        if line == self._last:
+            self._repeats += 1
+            # Long runs still show they are going on
+            if now - self._run_start >= self.summary_interval:
+                self._run_start = now
+                return False, self._flush()
+            return False, None
+
+        summary = self._flush()
+        self._last = line
+        self._run_start = now
+        return True, summary
+
+    def flush(self):
+        """Get the summary of repeats that weren't reported yet, or None"""
+        with self._lock:
+            return self._flush()
+
+    def flush_idle(self):
+        """Like flush(), but only once no line arrived for summary_interval seconds"""
+        with self._lock:
+            if time.monotonic() - self._last_time < self.summary_interval:
+                return None
+            return self._flush()
+
+    def _flush(self):
+        if not self._repeats:
+            return None
+        repeats, self._repeats = self._repeats, 0
+        return f"[Previous line repeated {repeats} more time{'s' if repeats > 1 else ''}]"
+
+
+class ConsoleSubscriber:
+    """
+    Bounded queue of (seq, line) pushed to one console stream client.
+
+    When the client doesn't keep up the oldest queued lines are dropped, so a
+    stalled client costs at most maxlen lines of memory.
+    """
+
+    def __init__(self, maxlen=1000):
+        self._queue = deque(maxlen=maxlen)
+        self._ready = threading.Condition()
+        self.dropped = 0  # Lines thrown away since the last get()
+
+    def push(self, seq, line):
+        with self._ready:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append((seq, line))
+            self._ready.notify()
+
+    def get(self, timeout=None, limit=500):
+        """
+        Wait for lines and take up to limit of them.
+
+        Returns:
+            tuple: ([(seq, line), ...], number of lines dropped before these), empty on timeout
+        """
+        with self._ready:
+            if not self._queue:
+                self._ready.wait(timeout)
+            batch = [self._queue.popleft() for _ in range(min(limit, len(self._queue)))]
+            dropped, self.dropped = self.dropped, 0
+        return batch, dropped
+
+
+class ConsoleBuffer:
+    """Fixed-capacity ring buffer of console lines with sequence numbers"""
+
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self._lines = [None] * capacity
+        self._next_seq = 0  # Sequence number the next appended line will get
+        self._floor_seq = 0  # Lines below this were dropped by clear()
+        self._subscribers = ()
+        # Only held for O(1) appends and for copying out a slice
+        self._lock = threading.Lock()
+
+    @property
+    def seq(self):
+        """Sequence number that will be assigned to the next line"""
+        return self._next_seq
+
+    @property
+    def first_seq(self):
+        """Sequence number of the oldest line still in the buffer"""
+        return max(self._floor_seq, self._next_seq - self.capacity)
+
+    def append(self, line):
+        """Add a line, overwriting the oldest one once the buffer is full"""
+        with self._lock:
+            self._lines[self._next_seq % self.capacity] = line
+            for subscriber in self._subscribers:
+                subscriber.push(self._next_seq, line)
+            self._next_seq += 1
+
+    def since(self, seq, limit=None):
+        """
+        Get all lines with a sequence number >= seq.
+
+        Returns:
+            tuple: (lines, cursor) where cursor should be passed back in on the next call.
+            If the caller fell behind, lines older than first_seq are silently skipped.
+        """
+        with self._lock:
+            end = self._next_seq
+            start = max(seq, self._floor_seq, end - self.capacity)
+            if limit is not None:
+                start = max(start, end - limit)
+            lines = [self._lines[i % self.capacity] for i in range(start, end)]
+        return lines, end
+
+    def subscribe(self, seq=None, maxlen=1000):
+        """
+        Get a ConsoleSubscriber that receives every line appended from now on.
+
+        Args:
+            seq: Also queue the buffered lines with a sequence number >= seq, None for only new lines
+            maxlen: Lines queued for the subscriber before the oldest get dropped
+        """
+        subscriber = ConsoleSubscriber(maxlen)
+        with self._lock:
+            # Backlog and registration under one lock, so no line is missed or sent twice
+            if seq is not None:
+                start = max(seq, self._floor_seq, self._next_seq - self.capacity)
+                for i in range(start, self._next_seq):
+                    subscriber.push(i, self._lines[i % self.capacity])
+            self._subscribers = (*self._subscribers, subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """Stop pushing lines to a subscriber"""
+        with self._lock:
+            self._subscribers = tuple(s for s in self._subscribers if s is not subscriber)
+
+    def tail(self, count):
+        """Get the last count lines"""
+        return self.since(0, limit=count)[0]
+
+    def clear(self):
+        """Drop all lines, sequence numbers keep counting up"""
+        with self._lock:
+            self._lines = [None] * self.capacity
+            self._floor_seq = self._next_seq
+
+    def __len__(self):
+        return self._next_seq - self.first_seq
+
+    def __iter__(self):
+        return iter(self.tail(self.capacity))
@@ -0,0 +1,95 @@
+from typing import NamedTuple, Callable
+import threading
+import re
+
+# Log messages come after "[12:00:00 INFO]: " (Paper) or "[12:00:00] [Server thread/INFO]: " (vanilla).
+# Anchoring on that keeps chat lines like "<Bob> Steve joined the game" from matching.
+_MESSAGE_START = r'(?:^|\]: )'
+_PLAYER = r'(?P<player>[A-Za-z0-9_]{1,16})'
+
+
+class ConsoleEvent(NamedTuple):
+    """Something that happened on the server, parsed from a console line"""
+    kind: str   # One of the EVENT_* constants
+    data: dict  # Named groups of the matching pattern
+    line: str   # Plain text of the line that produced the event
+
+
+EVENT_JOIN = "join"
+EVENT_LEAVE = "leave"
+EVENT_KICK = "kick"
+EVENT_READY = "ready"
+EVENT_PLUGIN_ENABLED = "plugin_enabled"
+EVENT_TPS_WARNING = "tps_warning"
+EVENT_SAVED = "saved"
+
+
+class _Rule(NamedTuple):
+    kind: str
+    needle: str          # Cheap substring check done before the regex
+    pattern: re.Pattern
+
+
+# Order matters only for lines matching several rules, every matching rule fires
+RULES = [
+    _Rule(EVENT_JOIN, " joined the game", re.compile(_MESSAGE_START + _PLAYER + r' joined the game')),
+    _Rule(EVENT_LEAVE, " left the game", re.compile(_MESSAGE_START + _PLAYER + r' left the game')),
+    _Rule(EVENT_KICK, "Kicked ", re.compile(_MESSAGE_START + r'Kicked ' + _PLAYER + r'(?: from the game)?: ?(?P<reason>.*)')),
+    _Rule(EVENT_READY, "Done (", re.compile(r'Done \((?P<seconds>\d+(?:[.,]\d+)?)s\)!')),
+    # Paper logs plugin messages as "[Plugin] Enabling Plugin v1.0"
+    _Rule(
+        EVENT_PLUGIN_ENABLED,
+        "Enabling ",
+        re.compile(_MESSAGE_START + r'(?:\[[^\]]+\] )?Enabling (?P<plugin>\S+) v(?P<version>\S+)')
+    ),
+    _Rule(
+        EVENT_TPS_WARNING,
+        "Can't keep up!",
+        re.compile(r"Can't keep up!.*?Running (?P<ms>\d+)ms or (?P<ticks>\d+) ticks behind")
+    ),
+    _Rule(EVENT_SAVED, "Saved the game", re.compile(_MESSAGE_START + r'Saved the game')),
+]
+
+
+class ConsoleEventDispatcher:
+    """Match console lines against the rule set and notify subscribers of typed events"""
+
+    def __init__(self, rules=None):
+        self.rules = RULES if rules is None else rules
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, kind:str | None, callback:Callable[[ConsoleEvent], None]):
+        """Call callback for every event of the given kind, or for all events if kind is None"""
+        with self._lock:
+            # Copy on write so dispatch never needs the lock
+            subscribers = dict(self._subscribers)
+            subscribers[kind] = [*subscribers.get(kind, []), callback]
+            self._subscribers = subscribers
+
+    def unsubscribe(self, kind:str | None, callback:Callable[[ConsoleEvent], None]):
+        """Stop calling a previously subscribed callback"""
+        with self._lock:
+            subscribers = dict(self._subscribers)
+            subscribers[kind] = [cb for cb in subscribers.get(kind, []) if cb != callback]
+            self._subscribers = subscribers
+
+    def dispatch(self, line:str):
+        """Check one plain-text line and emit any events it contains"""
+        events = []
+        for rule in self.rules:
+            if rule.needle not in line:
+                continue
+            match = rule.pattern.search(line)
+            if match:
+                events.append(ConsoleEvent(rule.kind, match.groupdict(), line))
+
+        subscribers = self._subscribers
+        for event in events:
+            for callback in (*subscribers.get(event.kind, ()), *subscribers.get(None, ())):
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"Error handling console event {event.kind}: {str(e)}")
+
+        return events
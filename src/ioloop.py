@@ -0,0 +1,176 @@
+import selectors
+import threading
+import codecs
+import time
+import os
+
+CHUNK_SIZE = 64 * 1024  # Bytes read from a pipe per wakeup
+IDLE_INTERVAL = 1.0     # Seconds between on_idle calls
+
+
+class LineSplitter:
+    """Turn chunks of UTF-8 bytes into lines, even when a chunk ends inside a character or line"""
+
+    def __init__(self, on_line):
+        self.on_line = on_line
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial = ""
+
+    def feed(self, data:bytes):
+        lines = (self._partial + self._decoder.decode(data)).split('\n')
+        self._partial = lines.pop()
+        for line in lines:
+            self._emit(line)
+
+    def close(self):
+        """Emit the last line if the stream didn't end with a newline"""
+        line = self._partial + self._decoder.decode(b"", final=True)
+        self._partial = ""
+        if line:
+            self._emit(line)
+
+    def _emit(self, line):
+        try:
+            self.on_line(line)
+        except Exception as e:
+            print(f"Error handling console line: {str(e)}")
+
+
+class _Pipe:
+    def __init__(self, stream, on_line, on_close, on_idle):
+        self.stream = stream
+        self.fd = stream.fileno()
+        self.splitter = LineSplitter(on_line)
+        self.on_close = on_close
+        self.on_idle = on_idle
+        self.closed = False
+
+    def read(self):
+        """Read a chunk, False once the pipe is closed"""
+        try:
+            data = os.read(self.fd, CHUNK_SIZE)
+        except BlockingIOError:
+            return True
+        except OSError:
+            data = b""
+
+        if not data:
+            return False
+        self.splitter.feed(data)
+        return True
+
+    def idle(self):
+        if not self.on_idle or self.closed:
+            return
+        try:
+            self.on_idle()
+        except Exception as e:
+            print(f"Error in console idle callback: {str(e)}")
+
+    def finish(self):
+        self.closed = True
+        self.splitter.close()
+        try:
+            self.stream.close()
+        except OSError:
+            pass
+        try:
+            self.on_close()
+        except Exception as e:
+            print(f"Error closing console pipe: {str(e)}")
+
+
+class ConsoleReader:
+    """
+    Reads the stdout pipes of all running servers from one thread.
+
+    Pipes are switched to non-blocking mode and watched with selectors
+    (epoll/kqueue/poll), every ready pipe gets one large read per wakeup and
+    complete lines are handed to its on_line callback. Windows can't select on
+    pipes, so there each pipe falls back to a blocking reader thread.
+
+    Every IDLE_INTERVAL seconds each pipe's on_idle callback is called too,
+    for work that has to happen even when no output arrives.
+    """
+
+    def __init__(self):
+        self._selector = None
+        self._lock = threading.Lock()
+        self._wake_r = self._wake_w = None
+        self._blocking = []  # Pipes read by fallback threads, they get on_idle from _tick_blocking
+        self._ticker = None
+
+    def register(self, stream, on_line, on_close, on_idle=None):
+        """Read lines from a binary pipe until it closes, then call on_close"""
+        pipe = _Pipe(stream, on_line, on_close, on_idle)
+
+        if os.name == 'nt':
+            with self._lock:
+                self._blocking.append(pipe)
+                if not self._ticker:
+                    self._ticker = threading.Thread(target=self._tick_blocking, daemon=True)
+                    self._ticker.start()
+            threading.Thread(target=self._read_blocking, args=(pipe,), daemon=True).start()
+            return
+
+        os.set_blocking(pipe.fd, False)
+        with self._lock:
+            self._start()
+            self._selector.register(pipe.fd, selectors.EVENT_READ, pipe)
+        # Make the loop pick up the new pipe right away
+        os.write(self._wake_w, b"\0")
+
+    def _start(self):
+        """Create the selector and its thread on first use"""
+        if self._selector:
+            return
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        last_idle = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now - last_idle >= IDLE_INTERVAL:
+                last_idle = now
+                with self._lock:
+                    pipes = [key.data for key in self._selector.get_map().values() if key.data]
+                for pipe in pipes:
+                    pipe.idle()
+
+            for key, _ in self._selector.select(max(0, last_idle + IDLE_INTERVAL - now)):
+                pipe = key.data
+                if pipe is None:
+                    # Wakeup pipe, only there to interrupt select()
+                    try:
+                        os.read(self._wake_r, 4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                if not pipe.read():
+                    with self._lock:
+                        self._selector.unregister(pipe.fd)
+                    pipe.finish()
+
+    def _read_blocking(self, pipe):
+        """Fallback for platforms that can't select on pipes"""
+        while pipe.read():
+            pass
+        with self._lock:
+            self._blocking.remove(pipe)
+        pipe.finish()
+
+    def _tick_blocking(self):
+        while True:
+            time.sleep(IDLE_INTERVAL)
+            with self._lock:
+                pipes = list(self._blocking)
+            for pipe in pipes:
+                pipe.idle()
+
+
+console_reader = ConsoleReader()
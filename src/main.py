@@ -1,14 +1,17 @@
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from charts import BlitChart, SparklineChart
+from config import flush_all as flush_config
 import tkinter.filedialog as filedialog
+from scheduler import backup_scheduler
+from metrics import get_metrics_store
 from validators import Validators
-import matplotlib.pyplot as plt
+from metricsdb import metrics_db
+from console import TAG_COLORS
 import customtkinter as tki
 from servers import Server
-import dns.resolver
+import numpy as np
 import subprocess
 import threading
 import traceback
-import requests
 import socket
 import psutil
 import shutil
@@ -29,6 +32,9 @@ def _resolve_hostname(hostname):
         return ip_address
     except socket.gaierror:...
 
+    # Only loaded when the system resolver failed, dnspython is slow to import
+    import dns.resolver
+
     # Try multiple public DNS resolvers if system DNS fails
     dns_servers = [
         '1.1.1.1',       # Cloudflare
@@ -98,6 +104,17 @@ class MCManager(tki.CTk):
             print(f'Creating server: {name}. Version: {software} {version}')
             self._create_server_thread(name, software, version, port, memory, backup_str)
 
+        if '-exportmetrics' in args:
+            # -exportmetrics <server> <file.csv> [hours]
+            index = args.index('-exportmetrics')
+            server_id, path = args[index+1], args[index+2]
+            hours = float(args[index+3]) if len(args) > index+3 and not args[index+3].startswith('-') else 24
+
+            metrics_db.flush()
+            count = metrics_db.export_csv(path, server_id, time.time() - hours * 3600)
+            print(f'Exported {count} rows of {server_id} metrics to {path}')
+            exit(0)
+
         if '-nogui' in args:
             if '-autostart' in args:
                 self.servers = self.get_server_list()
@@ -129,6 +146,10 @@ class MCManager(tki.CTk):
             # Servers exist, initialize normal UI
             self.initialize_main_ui()
 
+        if '-benchmarkstartup' in args:
+            # Print time to first paint and to interactive, then quit
+            self.bind("<Map>", self._benchmark_first_paint, add="+")
+
         # Start monitoring thread if main UI is initialized
         if hasattr(self, 'current_server'):
             self.running = True
@@ -145,6 +166,9 @@ class MCManager(tki.CTk):
                     exit(f'Error: No such server: {server_id}')
 
     def run(self):
+        # Creating a Server for every server directory takes a moment, so don't hold up the window
+        threading.Thread(target=self._schedule_backups, daemon=True).start()
+
         if '-nogui' not in self.args:
             self.mainloop()
         else:
@@ -155,6 +179,16 @@ class MCManager(tki.CTk):
                 command = input('')
                 self.current_server.send_command(command)
 
+    def _schedule_backups(self):
+        """Put every server with an enabled backup schedule on the backup scheduler"""
+        for server_name in self.get_server_list():
+            current = getattr(self, 'current_server', None)
+            try:
+                server = current if current and current.name == server_name else Server(server_name)
+                server.schedule_next_backup()
+            except Exception as e:
+                print(f"Could not schedule backups of {server_name}: {str(e)}")
+
     def mainloop(self, *args, **kwargs):
         self.tk_running = True
         try:
@@ -162,11 +196,56 @@ class MCManager(tki.CTk):
         finally:
             self.tk_running = False
 
+    def _benchmark_first_paint(self, event):
+        """Called when the window gets mapped, records when its first frame is drawn"""
+        if event.widget is not self or hasattr(self, 'benchmark_times'):
+            return
+
+        # Draw everything that is pending so the timestamp is when the window is actually painted
+        self.update_idletasks()
+        self.benchmark_times = {"first paint": self._seconds_since_process_start()}
+
+        self._probe_count = 0
+        self._probe_sent = time.perf_counter()
+        self.after(10, self._benchmark_probe)
+
+    def _benchmark_probe(self):
+        """Count the window as interactive once the event loop answers 10 ms timers on time 3 times in a row"""
+        late = time.perf_counter() - self._probe_sent - 0.010
+        if late < 0.005:
+            if not self._probe_count:
+                # Interactive since the first probe of the streak was sent
+                self._interactive_at = self._seconds_since_process_start() - (time.perf_counter() - self._probe_sent)
+            self._probe_count += 1
+        else:
+            self._probe_count = 0
+
+        if self._probe_count < 3:
+            self._probe_sent = time.perf_counter()
+            self.after(10, self._benchmark_probe)
+            return
+
+        self.benchmark_times["interactive"] = self._interactive_at
+        print('Startup benchmark: ' + ', '.join(f'{name} {seconds:.3f}s' for name, seconds in self.benchmark_times.items()))
+        sys.stdout.flush()
+        self.on_closing()
+
+    def _seconds_since_process_start(self):
+        """Time since the interpreter was started, so module imports are counted too"""
+        return time.time() - psutil.Process().create_time()
+
     def on_closing(self):
         """Handle application shutdown properly - with FORCED silent exit"""
         # Set running flag to False to stop monitoring thread
         self.running = False
 
+        # Write debounced config changes and pending metrics before we force exit
+        try:
+            flush_config()
+            metrics_db.flush()
+        except Exception:
+            ...
+
         try:
             self.current_server.stop()
         except Exception:
@@ -304,7 +383,7 @@ class MCManager(tki.CTk):
         self.tunnel_button.grid(row=2, column=0, columnspan=2, padx=3, pady=3, sticky="ew")
 
         # Create main content area with tabview - REDUCED PADDING
-        self.tabview = tki.CTkTabview(self, corner_radius=6)
+        self.tabview = tki.CTkTabview(self, corner_radius=6, command=self._on_tab_selected)
         self.tabview.grid(row=0, column=1, sticky="nsew", padx=(0,10), pady=(0,10))  # REDUCED PADDING
 
         # Create tabs
@@ -323,14 +402,20 @@ class MCManager(tki.CTk):
             tab.grid_columnconfigure(0, weight=1)
             tab.grid_rowconfigure(0, weight=1)
 
-        # Setup tab contents
-        self.setup_dashboard_tab()
-        self.setup_console_tab()
-        self.setup_plugins_tab()
-        self.setup_players_tab()
-        self.setup_backups_tab()
-        self.setup_settings_tab()
-        self.setup_optimizations_tab()
+        # Tab contents are only built the first time a tab gets selected
+        self.tab_builders = {
+            "Dashboard": self.setup_dashboard_tab,
+            "Console": self.setup_console_tab,
+            "Plugins": self.setup_plugins_tab,
+            "Players": self.setup_players_tab,
+            "Backups": self.setup_backups_tab,
+            "Settings": self.setup_settings_tab,
+            "Optimizations": self.setup_optimizations_tab
+        }
+        self.built_tabs = set()
+
+        # Dashboard is the tab shown on start
+        self._build_tab("Dashboard")
 
         # Initialize with first server if available
         if self.servers:
@@ -339,6 +424,34 @@ class MCManager(tki.CTk):
         else:
             self.current_server: Server | None = None
 
+    def _on_tab_selected(self):
+        """Build the selected tab if this is the first time it is shown"""
+        self._build_tab(self.tabview.get())
+
+    def _build_tab(self, name):
+        """Create a tab's widgets and fill them with the current server's data"""
+        if name in self.built_tabs:
+            return
+        self.built_tabs.add(name)
+        self.tab_builders[name]()
+
+        if not getattr(self, 'current_server', None):
+            return
+
+        # The tab missed every update made before it existed
+        if name == "Console":
+            self._render_new_console_lines()
+        elif name == "Plugins":
+            self.update_plugins()
+        elif name == "Players":
+            self.update_players()
+        elif name == "Backups":
+            self.update_backups()
+        elif name == "Settings" and hasattr(self, 'settings'):
+            self.apply_settings_to_ui()
+        elif name == "Optimizations":
+            self.load_optimization_settings()
+
     def show_no_servers_ui(self):
         """Display UI for when no servers are configured - MORE COMPACT"""
         # Configure grid for empty state
@@ -1366,6 +1479,7 @@ class MCManager(tki.CTk):
             backup=None
         ):  # sourcery skip: extract-method, low-code-quality
         """Thread to handle server creation process"""
+        import requests
 
         try:
             if '-nogui' not in self.args:
@@ -1771,6 +1885,7 @@ class MCManager(tki.CTk):
         """Change the current selected server"""
         self.current_server = Server(server_name)
         self.current_server.update_status()
+        self.current_server.schedule_next_backup()
 
         # Add this line to load settings when a server is selected
         self.load_server_settings()
@@ -1780,7 +1895,7 @@ class MCManager(tki.CTk):
             return
         try:
             self.update_dashboard()
-            self.update_console()
+            self._render_new_console_lines()
             self.update_players()
             self.update_plugins()
 
@@ -1832,9 +1947,7 @@ class MCManager(tki.CTk):
         if not hasattr(self, 'current_server') or not self.current_server:
             return
 
-        server_dir = self.current_server.base_dir
-        config_file = os.path.join(server_dir, "server_config.json")
-        props_file = os.path.join(server_dir, "server.properties")
+        config = self.current_server.config
 
         # Default settings
         self.settings = {
@@ -1858,47 +1971,35 @@ class MCManager(tki.CTk):
             }
         }
 
-        # Load from file if it exists
-        if os.path.exists(config_file):
+        # Load from the cached config if it exists
+        if config.exists():
             try:
-                with open(config_file, 'r') as f:
-                    saved_settings = json.load(f)
-
-                    # Update settings with saved values
-                    for category in ["general", "world", "advanced"]:
-                        if category in saved_settings:
-                            self.settings[category].update(saved_settings[category])
+                # Update settings with saved values
+                for category in ["general", "world", "advanced"]:
+                    self.settings[category].update(config.section(category))
 
                 # Also read from server.properties for additional settings
-                if os.path.exists(props_file):
-                    with open(props_file, 'r') as f:
-                        for line in f:
-                            line = line.strip()
-                            if line and not line.startswith('#'):
-                                try:
-                                    key, value = line.split('=', 1)
-                                    # Map to the right category
-                                    if key in ['gamemode', 'difficulty', 'motd', 'server-port', 'max-players']:
-                                        self.settings['general'][key] = value
-                                    elif key in ['level-seed', 'level-type', 'generate-structures',
-                                                 'allow-nether', 'spawn-npcs', 'spawn-animals', 'spawn-monsters']:
-                                        # Convert string boolean values to actual boolean
-                                        if value.lower() == 'true':
-                                            self.settings['world'][key] = True
-                                        elif value.lower() == 'false':
-                                            self.settings['world'][key] = False
-                                        else:
-                                            self.settings['world'][key] = value
-                                    elif key in ['online-mode', 'enable-command-block', 'pvp',
-                                                'force-gamemode', 'allow-flight', 'view-distance']:
-                                        if value.lower() == 'true':
-                                            self.settings['advanced'][key] = True
-                                        elif value.lower() == 'false':
-                                            self.settings['advanced'][key] = False
-                                        else:
-                                            self.settings['advanced'][key] = value
-                                except Exception:
-                                    pass
+                for key, value in self.current_server.properties.as_dict().items():
+                    # Map to the right category
+                    if key in ['gamemode', 'difficulty', 'motd', 'server-port', 'max-players']:
+                        self.settings['general'][key] = value
+                    elif key in ['level-seed', 'level-type', 'generate-structures',
+                                 'allow-nether', 'spawn-npcs', 'spawn-animals', 'spawn-monsters']:
+                        # Convert string boolean values to actual boolean
+                        if value.lower() == 'true':
+                            self.settings['world'][key] = True
+                        elif value.lower() == 'false':
+                            self.settings['world'][key] = False
+                        else:
+                            self.settings['world'][key] = value
+                    elif key in ['online-mode', 'enable-command-block', 'pvp',
+                                'force-gamemode', 'allow-flight', 'view-distance']:
+                        if value.lower() == 'true':
+                            self.settings['advanced'][key] = True
+                        elif value.lower() == 'false':
+                            self.settings['advanced'][key] = False
+                        else:
+                            self.settings['advanced'][key] = value
 
                 # Update UI with loaded settings
                 if '-nogui' not in self.args and hasattr(self, 'current_server') and self.current_server and self.current_server._is_running:
@@ -2052,6 +2153,8 @@ class MCManager(tki.CTk):
 
     def _setup_tunnel_thread(self, port):
         """Thread to handle ngrok setup and tunnel creation"""
+        import requests
+
         try:
             # Add log entry
             self._add_tunnel_log("Starting tunnel setup...")
@@ -2323,6 +2426,13 @@ class MCManager(tki.CTk):
             row=2, column=0, padx=10, pady=(0, 10), sticky="new"
         )
 
+        # Matplotlib costs a lot of startup time and memory, so only use it when asked for
+        charts_index = self.args.index('-charts') + 1 if '-charts' in self.args else None
+        if charts_index is not None and charts_index < len(self.args) and self.args[charts_index] == 'matplotlib':
+            self.chart_class = BlitChart
+        else:
+            self.chart_class = SparklineChart
+
         # Resource usage frames - REDUCED PADDING, SMALLER CHARTS
         self.resources_frame = tki.CTkFrame(self.dashboard_tab)
         self.resources_frame.grid(
@@ -2335,11 +2445,6 @@ class MCManager(tki.CTk):
         self.resources_frame.grid_columnconfigure(0, weight=1)
         self.resources_frame.grid_columnconfigure(1, weight=1)
 
-        # Get the background color from the app theme
-        bg_color = "#2b2b2b"  # Dark theme background
-        grid_color = "#3f3f3f"
-        text_color = "#dcddde"
-
         # CPU Usage Chart - SMALLER SIZE
         self.cpu_frame = tki.CTkFrame(self.resources_frame)
         self.cpu_frame.grid(
@@ -2372,44 +2477,9 @@ class MCManager(tki.CTk):
         )
         self.cpu_value_label.pack(side="right", padx=(0, 5))
 
-        # Create matplotlib figure for CPU - SMALLER SIZE
-        self.cpu_fig, self.cpu_ax = plt.subplots(figsize=(3, 2))  # SMALLER FIGURE
-        self.cpu_canvas = FigureCanvasTkAgg(
-            self.cpu_fig,
-            master=self.cpu_frame
-        )
-        self.cpu_canvas.get_tk_widget().pack(
-            fill=tki.BOTH,
-            expand=True,
-            padx=5,
-            pady=5  # REDUCED PADDING
-        )
-
-        # Style the CPU plot
-        self.cpu_fig.patch.set_facecolor(bg_color)
-        self.cpu_ax.set_facecolor(bg_color)
-        self.cpu_ax.tick_params(
-            axis='both',
-            colors=text_color,
-            labelsize=7
-        )
-        self.cpu_ax.xaxis.label.set_color(text_color)
-        self.cpu_ax.yaxis.label.set_color(text_color)
-        self.cpu_ax.spines['bottom'].set_color(grid_color)
-        self.cpu_ax.spines['top'].set_color(grid_color)
-        self.cpu_ax.spines['left'].set_color(grid_color)
-        self.cpu_ax.spines['right'].set_color(grid_color)
-
-        self.cpu_data = []
-        self.cpu_times = []
-        self.cpu_line, = self.cpu_ax.plot(
-            [],
-            [],
-            'b-',
-            linewidth=1.5
-        )
+        # CPU chart - native sparkline unless started with "-charts matplotlib"
+        self.cpu_chart = self.chart_class(self.cpu_frame, 'blue')
 
-        self.cpu_ax.set_ylim(0, 100)
         self.uptime_value = tki.CTkLabel(self.info_frame, text="00:00:00")
         self.uptime_value.grid(row=0, column=1, padx=5, pady=5, sticky="w")  # REDUCED PADDING
 
@@ -2451,44 +2521,41 @@ class MCManager(tki.CTk):
         )
         self.ram_value_label.pack(side="right", padx=(0, 5))
 
-        # Create matplotlib figure for RAM - SMALLER SIZE
-        self.ram_fig, self.ram_ax = plt.subplots(figsize=(3, 2))  # SMALLER FIGURE
-        self.ram_canvas = FigureCanvasTkAgg(
-            self.ram_fig,
-            master=self.ram_frame
-        )
-        self.ram_canvas.get_tk_widget().pack(
-            fill=tki.BOTH,
-            expand=True,
+        # RAM chart
+        self.ram_chart = self.chart_class(self.ram_frame, 'green')
+
+        # TPS Chart, filled from RCON polls
+        self.tps_frame = tki.CTkFrame(self.resources_frame)
+        self.tps_frame.grid(
+            row=1,
+            column=0,
+            columnspan=2,
             padx=5,
-            pady=5  # REDUCED PADDING
+            pady=5,
+            sticky="nsew"
         )
 
-        # Style the RAM plot
-        self.ram_fig.patch.set_facecolor(bg_color)
-        self.ram_ax.set_facecolor(bg_color)
-        self.ram_ax.tick_params(
-            axis='both',
-            colors=text_color,
-            labelsize=7
+        tps_header = tki.CTkFrame(
+            self.tps_frame,
+            fg_color="transparent"
         )
-        self.ram_ax.xaxis.label.set_color(text_color)
-        self.ram_ax.yaxis.label.set_color(text_color)
-        self.ram_ax.spines['bottom'].set_color(grid_color)
-        self.ram_ax.spines['top'].set_color(grid_color)
-        self.ram_ax.spines['left'].set_color(grid_color)
-        self.ram_ax.spines['right'].set_color(grid_color)
-
-        self.ram_data = []
-        self.ram_times = []
-        self.ram_line, = self.ram_ax.plot(
-            [],
-            [],
-            'g-',
-            linewidth=1.5
+        tps_header.pack(fill="x", pady=(5, 0))
+
+        self.tps_label = tki.CTkLabel(
+            tps_header,
+            text="TPS",
+            font=tki.CTkFont(weight="bold")
+        )
+        self.tps_label.pack(side="left", padx=(5, 0))
+
+        self.tps_value_label = tki.CTkLabel(
+            tps_header,
+            text="-",
+            text_color="orange"
         )
+        self.tps_value_label.pack(side="right", padx=(0, 5))
 
-        self.ram_ax.set_ylim(0, 110)
+        self.tps_chart = self.chart_class(self.tps_frame, 'orange')
 
         # Add the missing uptime label and player count
         self.uptime_label = tki.CTkLabel(self.info_frame, text="Uptime:", font=tki.CTkFont(weight="bold"))
@@ -2503,10 +2570,42 @@ class MCManager(tki.CTk):
         self.players_value = tki.CTkLabel(self.info_frame, text="0/0")
         self.players_value.grid(row=1, column=1, padx=5, pady=5, sticky="w")
 
+        # Chart range, history comes from the server's metrics store
+        self.chart_ranges = {
+            "Last minute": 60,
+            "Last hour": 3600,
+            "Last day": 86400,
+            "Last week": 7 * 86400,
+            "Last month": 30 * 86400
+        }
+        self.chart_seconds = 60
+        self.chart_range_option = tki.CTkOptionMenu(
+            self.status_frame,
+            values=list(self.chart_ranges),
+            command=lambda choice: setattr(self, 'chart_seconds', self.chart_ranges[choice]),
+            width=130
+        )
+        self.chart_range_option.grid(row=0, column=2, padx=5, pady=5, sticky="e")
+        self.status_frame.grid_columnconfigure(2, weight=1)
+
+        self.advanced_charts_btn = tki.CTkButton(
+            self.status_frame,
+            text="Advanced Charts",
+            command=self.open_advanced_charts,
+            width=130
+        )
+        self.advanced_charts_btn.grid(row=1, column=2, padx=5, pady=5, sticky="e")
+
+        # Status getters only read the cached snapshot, so refreshing is cheap
+        self.after(1000, self.update_dashboard_periodic)
+        self.after(500, self.update_charts)
+
     def setup_console_tab(self):
         """Setup the console tab with live server console output"""
         # Create console output area
         self.console_output = tki.CTkTextbox(self.console_tab, wrap="word")
+        self.console_max_lines = 1000  # Older lines get trimmed from the top
+        self.console_line_count = 0
         self.console_output.grid(row=0, column=0, sticky="nsew", padx=10, pady=(10, 5))
 
         # Create input frame
@@ -2529,6 +2628,14 @@ class MCManager(tki.CTk):
 
         self.send_button.grid(row=0, column=1)
 
+        self.export_console_button = tki.CTkButton(
+            self.console_input_frame,
+            text="Export",
+            command=self.export_console,
+            width=80
+        )
+        self.export_console_button.grid(row=0, column=2, padx=(5, 0))
+
         # Bind Enter key to send command
         self.console_input.bind("<Return>", lambda event: self.send_command())
 
@@ -2760,6 +2867,12 @@ class MCManager(tki.CTk):
             sticky="ew"
         )
 
+        self.next_backup_label = tki.CTkLabel(
+            self.backup_schedule_frame,
+            text="Next backup: not scheduled"
+        )
+        self.next_backup_label.grid(row=4, column=0, columnspan=2, padx=10, pady=(0, 10), sticky="w")
+
     def setup_settings_tab(self):  # sourcery skip: low-code-quality
         """Setup the settings tab with server configuration options"""
         # Create settings frame
@@ -3245,18 +3358,10 @@ class MCManager(tki.CTk):
     # Resource monitoring
     def monitor_resources(self):    # sourcery skip: low-code-quality
         """Monitor and update resource usage periodically with improved stability"""
-        max_points = 60  # Store last 60 data points
         cpu_count = psutil.cpu_count()  # Get number of CPU cores
 
-        # Initialize with empty data
-        self.cpu_data = []
-        self.cpu_times = []
-        self.ram_data = []
-        self.ram_times = []
-
         # Track server state to detect changes
         was_running = False
-        last_idx = 0  # Keep track of the last plot index
 
         if not hasattr(self, 'settings'):
             self.load_server_settings()
@@ -3264,7 +3369,7 @@ class MCManager(tki.CTk):
         max_ram_gb = float(self.settings.get('advanced',{}).get('memory', 4096)) / 1024
 
         if '-nogui' in self.args:
-            console = ''
+            console_seq = 0
             is_terminal = os.isatty(sys.stdout.fileno())
 
             while self.running:
@@ -3272,26 +3377,18 @@ class MCManager(tki.CTk):
                     cpu_usage = self.current_server.get_cpu()
                     ram_usage = self.current_server.get_ram()
 
-                    # Log console (only show new content)
-                    new_console = self.current_server.get_console()
-                    if new_console != console:
-                        new_content = new_console.removeprefix(console)
-                        if new_content:
-                            # Clear current line before printing
-                            if is_terminal:
-                                sys.stdout.write("\r\033[K")  # Clear the line
-
-                            # Print the new content
-                            print(new_content, end='', flush=True)
-
-                            # Add a new command prompt if needed
-                            if is_terminal and not new_content.endswith('\n'):
-                                print()  # Ensure we're on a new line
+                    # Log console (only show new lines)
+                    new_lines, console_seq = self.current_server.get_console_since(console_seq)
+                    if new_lines:
+                        # Clear current line before printing
+                        if is_terminal:
+                            sys.stdout.write("\r\033[K")  # Clear the line
 
-                            # Add command prompt after console output
-                            print("> ", end='', flush=True)
+                        # Print the new content
+                        print("\n".join(line.text for line in new_lines), flush=True)
 
-                        console = new_console
+                        # Add command prompt after console output
+                        print("> ", end='', flush=True)
 
                     # Normalize CPU usage and update resource display
                     normalized_cpu = cpu_usage / cpu_count if cpu_count > 0 else cpu_usage
@@ -3360,40 +3457,11 @@ class MCManager(tki.CTk):
                                 self.ram_value_label.configure(text=text)
                                 if hasattr(self, 'ram_value_label') else None)
 
-                        # Update graph data - use continuous indexing instead of modulo
-                        last_idx += 1
-
-                        # Only add points if values are valid
-                        if normalized_cpu >= 0:
-                            self.cpu_times.append(last_idx)
-                            self.cpu_data.append(min(100,normalized_cpu))
-
-                        if ram_pct >= 0:
-                            self.ram_times.append(last_idx)
-                            self.ram_data.append(min(100,ram_pct))
-
-                        # Keep only the most recent points
-                        if len(self.cpu_times) > max_points:
-                            self.cpu_times = self.cpu_times[-max_points:]
-                            self.cpu_data = self.cpu_data[-max_points:]
-
-                        if len(self.ram_times) > max_points:
-                            self.ram_times = self.ram_times[-max_points:]
-                            self.ram_data = self.ram_data[-max_points:]
-
                     except Exception as e:
                         print(f"Error collecting resource data: {e}")
 
                 elif server_state_changed:
-                    print("Dropping graph data.")
-
-                    self.cpu_data = []
-                    self.cpu_times = []
-                    self.ram_data = []
-                    self.ram_times = []
-                    last_idx = 0  # Reset the counter too
-
-                    # Reset labels
+                    # History stays in the metrics store, only reset labels
                     if hasattr(self, 'cpu_value_label') and self.running:
                         self.after(0, lambda:
                             self.cpu_value_label.configure(text="0.0%")
@@ -3404,40 +3472,6 @@ class MCManager(tki.CTk):
                             self.ram_value_label.configure(text="0 MB (0.00 GB, 0.0%)")
                             if hasattr(self, 'ram_value_label') else None)
 
-                # Always update plots when UI exists
-                if all(hasattr(self, attr) for attr in ['cpu_line', 'ram_line', 'cpu_canvas', 'ram_canvas']) and self.running:
-                    try:
-                        # Update the plot data
-                        self.cpu_line.set_data(self.cpu_times, self.cpu_data)
-                        self.ram_line.set_data(self.ram_times, self.ram_data)
-
-                        # Adjust x-axis limits
-                        if self.cpu_times or self.ram_times:
-                            # Use the longest data array to determine x limits
-                            latest_point = max(
-                                self.cpu_times[-1] if self.cpu_times else 0,
-                                self.ram_times[-1] if self.ram_times else 0
-                            )
-                            x_min = max(0, latest_point - 60)
-                            x_max = max(60, latest_point)
-                            self.cpu_ax.set_xlim(x_min, x_max)
-                            self.ram_ax.set_xlim(x_min, x_max)
-                        else:
-                            self.cpu_ax.set_xlim(0, 60)
-                            self.ram_ax.set_xlim(0, 60)
-
-                        # Always use 0-100% range for y-axis
-                        self.cpu_ax.set_ylim(0, 100)
-                        self.ram_ax.set_ylim(0, 110)
-
-                        # Redraw the canvases
-                        if self.tk_running:
-                            self.cpu_canvas.draw_idle()
-                            self.ram_canvas.draw_idle()
-                    except Exception as e:
-                        print(f"Error updating plots: {e}")
-                        traceback.print_exc()
-
             except Exception as e:
                 print(f"Error in monitor_resources: {e}")
                 traceback.print_exc()
@@ -3445,6 +3479,128 @@ class MCManager(tki.CTk):
             # Sleep interval
             time.sleep(0.5)  # Update every half second
 
+    def update_charts(self):
+        """Redraw the dashboard charts on the Tk thread, skipped while nobody can see them"""
+        try:
+            if self._charts_visible():
+                self._draw_charts()
+        except Exception as e:
+            print(f"Error updating plots: {e}")
+            traceback.print_exc()
+        finally:
+            self.after(500, self.update_charts)
+
+    def _charts_visible(self):
+        """Check if the Dashboard tab is showing in a window that isn't minimized"""
+        if not (hasattr(self, 'current_server') and self.current_server):
+            return False
+        if self.state() in ("iconic", "withdrawn"):
+            return False
+        return self.tabview.get() == "Dashboard"
+
+    def _draw_charts(self):
+        """Push the selected range of the metric history into the charts"""
+        now = time.time()
+        store = get_metrics_store(self.current_server.name)
+        newest = store.series["cpu"].last()
+
+        # A stopped server produces no new samples, don't redraw identical lines
+        key = (self.current_server.name, self.chart_seconds, newest[0] if newest else None)
+        if key == getattr(self, 'charts_key', None) and not self.current_server.is_running():
+            return
+        self.charts_key = key
+
+        if self.chart_seconds <= 3600:
+            cpu_times, cpu_data = store.window("cpu", self.chart_seconds, now=now)
+            ram_times, ram_data = store.window("rss", self.chart_seconds, now=now)
+            tps_times, tps_data = store.window("tps", self.chart_seconds, now=now)
+        else:
+            # Longer ranges come from the persisted history, which includes earlier runs
+            cpu_times, cpu_data, ram_times, ram_data, tps_times, tps_data = self._load_chart_history(now)
+
+        max_ram_mb = float(getattr(self, 'settings', {}).get('advanced', {}).get('memory', 4096)) or 16384
+
+        # x is seconds relative to now, so the axes only change with the selected range
+        xlim = (-self.chart_seconds, 0)
+        self.cpu_chart.update(cpu_times - now, np.minimum(cpu_data, 100), xlim, (0, 100))
+        self.ram_chart.update(ram_times - now, np.minimum(ram_data / max_ram_mb * 100, 100), xlim, (0, 110))
+        # Servers normally run at 20 TPS, a little headroom keeps the line off the top edge
+        self.tps_chart.update(tps_times - now, np.minimum(tps_data, 20), xlim, (0, 21))
+
+        tps = self.current_server.tps if self.current_server.is_running() else None
+        self.tps_value_label.configure(text=f"{tps:.1f}" if tps is not None else "-")
+
+    def open_advanced_charts(self):
+        """Open a window with matplotlib charts of every metric (loads matplotlib on first use)"""
+        if getattr(self, 'advanced_charts', None) and self.advanced_charts.winfo_exists():
+            self.advanced_charts.focus()
+            return
+
+        self.advanced_charts = tki.CTkToplevel(self)
+        self.advanced_charts.title("Advanced Charts")
+        self.advanced_charts.geometry("800x500")
+        self.advanced_charts.grid_columnconfigure((0, 1), weight=1)
+        self.advanced_charts.grid_rowconfigure((0, 1), weight=1)
+
+        # (title, metric, color, y limits)
+        layout = [
+            ("CPU Usage (%)", "cpu", "blue", (0, 100)),
+            ("RAM Usage (MB)", "rss", "green", None),
+            ("Players", "players", "orange", None),
+            ("TPS", "tps", "purple", (0, 21))
+        ]
+
+        self.advanced_chart_list = []
+        for i, (title, metric, color, ylim) in enumerate(layout):
+            frame = tki.CTkFrame(self.advanced_charts)
+            frame.grid(row=i // 2, column=i % 2, padx=5, pady=5, sticky="nsew")
+
+            label = tki.CTkLabel(frame, text=title, font=tki.CTkFont(weight="bold"))
+            label.pack(anchor="w", padx=5, pady=(5, 0))
+
+            chart = BlitChart(frame, color, figsize=(4, 2.5))
+            self.advanced_chart_list.append((chart, metric, ylim))
+
+        self.update_advanced_charts()
+
+    def update_advanced_charts(self):
+        """Refresh the advanced charts while their window is open"""
+        if not (getattr(self, 'advanced_charts', None) and self.advanced_charts.winfo_exists()):
+            return
+
+        try:
+            if hasattr(self, 'current_server') and self.current_server:
+                now = time.time()
+                store = get_metrics_store(self.current_server.name)
+                for chart, metric, ylim in self.advanced_chart_list:
+                    times, values = store.window(metric, self.chart_seconds, now=now)
+                    if ylim is None:
+                        # Round the top up so the axes don't redraw on every small change
+                        top = max(10.0, float(values.max()) * 1.1 if len(values) else 0)
+                        step = 10 ** np.floor(np.log10(top))
+                        ylim = (0, float(np.ceil(top / step) * step))
+                    chart.update(times - now, values, (-self.chart_seconds, 0), ylim)
+        except Exception as e:
+            print(f"Error updating advanced charts: {e}")
+
+        self.advanced_charts.after(1000, self.update_advanced_charts)
+
+    def _load_chart_history(self, now):
+        """Get CPU, RSS and TPS history from the metrics database, re-queried at most every 30 seconds"""
+        key = (self.current_server.name, self.chart_seconds)
+        cached = getattr(self, 'chart_history', None)
+        if cached and cached[0] == key and now - cached[1] < 30:
+            return cached[2]
+
+        history = []
+        for metric in ("cpu", "rss", "tps"):
+            rows = metrics_db.query(self.current_server.name, metric, now - self.chart_seconds, now)
+            data = np.array(rows, dtype=np.float64).reshape(-1, 2)
+            history.extend((data[:, 0], data[:, 1]))
+
+        self.chart_history = (key, now, tuple(history))
+        return self.chart_history[2]
+
     def _update_cursor_and_display_status(self, status_msg):
         # Save cursor position
         sys.stderr.write('\033[s')
@@ -3485,161 +3641,133 @@ class MCManager(tki.CTk):
         minutes, seconds = divmod(remainder, 60)
         self.uptime_value.configure(text=f"{hours:02d}:{minutes:02d}:{seconds:02d}")
 
+    def update_dashboard_periodic(self):
+        """Refresh dashboard labels from the cached server status"""
+        try:
+            if hasattr(self, 'current_server') and self.current_server:
+                self.update_dashboard()
+        except Exception as e:
+            print(f"Error updating dashboard: {e}")
+        finally:
+            self.after(1000, self.update_dashboard_periodic)
+
     def update_console(self):
-        """Update console text with latest output"""
+        """Periodically append new server output to the console tab"""
+        delay = 100
+        try:
+            self._render_new_console_lines()
+
+            # Refresh less often while the server floods its console
+            if getattr(self, 'current_server', None):
+                rate = self.current_server.flood_guard.lines_per_second
+                if rate > 1000:
+                    delay = 1000
+                elif rate > 100:
+                    delay = 300
+        finally:
+            # Schedule next update
+            self.after(delay, self.update_console)
+
+    def _render_new_console_lines(self):
+        """Append console lines we have not shown yet and trim the oldest ones"""
         if not (
                 hasattr(self, 'current_server')
                 and self.current_server
                 and hasattr(self, 'console_output')
             ):
-            # Schedule next update
-            self.after(100, self.update_console)
             return
-        else:
-            console_text = self.current_server.get_console()
 
-        if console_text == self.console_output.get("1.0", tki.END).strip():
-            # Schedule next update
-            self.after(100, self.update_console)
+        # Start from scratch when a different server got selected
+        if getattr(self, 'console_server', None) is not self.current_server:
+            self.console_server = self.current_server
+            self.console_seq = 0
+            self.console_output.configure(state="normal")
+            self.console_output.delete("1.0", tki.END)
+            self.console_output.configure(state="disabled")
+            self.console_line_count = 0
+
+        new_lines, self.console_seq = self.current_server.get_console_since(
+            self.console_seq,
+            limit=self.console_max_lines
+        )
+        if not new_lines:
             return
 
-        # Save current position
-        current_pos = self.console_output.yview()
+        textbox = self.console_output._textbox
+
+        # Remember where the user is so we can keep the view still
+        following = self.console_output.yview()[1] >= 0.999
+        top_line = int(textbox.index("@0,0").split('.')[0])
 
         self.console_output.configure(state="normal")
-        self.console_output.delete("1.0", tki.END)
 
         # Setup text tags for ANSI colors if they don't exist yet
         if not hasattr(self, 'console_tags_configured'):
             self._setup_console_tags()
 
-        # Parse ANSI color codes and insert with appropriate tags
-        self._insert_colored_text(console_text)
+        # Append lines using the color spans parsed when they were read
+        for line in new_lines:
+            if self.console_line_count:
+                textbox.insert(tki.END, "\n")
+            self._insert_colored_text(line)
+            self.console_line_count += 1
 
-        # Handle auto-scrolling
-        self._handle_console_scroll(current_pos)
+        # Trim lines from the top once we are over the limit
+        excess = self.console_line_count - self.console_max_lines
+        if excess > 0:
+            textbox.delete("1.0", f"{excess + 1}.0")
+            self.console_line_count -= excess
+
+        if following:
+            self.console_output.see(tki.END)
+        else:
+            # Keep the same lines in view even though the top got trimmed
+            textbox.yview(f"{max(1, top_line - max(0, excess))}.0")
 
         self.console_output.configure(state="disabled")
 
-        # Schedule next update
-        self.after(100, self.update_console)
+    def export_console(self):
+        """Save the current server's console output as colored HTML or plain text"""
+        if not self.current_server:
+            return
+
+        path = filedialog.asksaveasfilename(
+            title="Export Console",
+            defaultextension=".html",
+            initialfile=f"{self.current_server.name}-console.html",
+            filetypes=[("HTML with colors", "*.html"), ("Plain text", "*.txt")]
+        )
+        if not path:
+            return
+
+        if self.current_server.export_console(path):
+            self.show_notification(f"Console exported to {os.path.basename(path)}")
+        else:
+            self.show_notification("Failed to export console", "error")
 
     def _setup_console_tags(self):
         """Configure tags for ANSI color codes"""
-        # Basic colors
-        color_map = {
-            "red": "red",
-            "green": "green",
-            "yellow": "yellow",
-            "blue": "blue",
-            "magenta": "magenta",
-            "cyan": "cyan",
-            "white": "white",
-            "bright_red": "#ff5555",
-            "bright_green": "#55ff55",
-            "bright_yellow": "#ffff55",
-            "bright_blue": "#5555ff",
-            "bright_magenta": "#ff55ff",
-            "bright_cyan": "#55ffff",
-            "bright_white": "#ffffff"
-        }
-
-        for tag_name, color in color_map.items():
+        for tag_name, color in TAG_COLORS.items():
             self.console_output._textbox.tag_configure(tag_name, foreground=color)
 
         # Initialize RGB tag tracking
         self.rgb_tags = set()
         self.console_tags_configured = True
 
-    def _insert_colored_text(self, console_text):
-        """Parse ANSI codes and insert text with appropriate formatting"""
-        import re
-        ansi_pattern = re.compile(r'\033\[([\d;]*)m')
-        current_pos = 0
-        current_tag = None
-
-        # Map ANSI codes to tag names
-        ansi_code_map = {
-            '31': "red",
-            '32': "green",
-            '33': "yellow",
-            '34': "blue",
-            '35': "magenta",
-            '36': "cyan",
-            '37': "white",
-            '91': "bright_red",
-            '92': "bright_green",
-            '93': "bright_yellow",
-            '94': "bright_blue",
-            '95': "bright_magenta",
-            '96': "bright_cyan",
-            '97': "bright_white"
-        }
-
-        # Find all ANSI codes
-        for match in ansi_pattern.finditer(console_text):
-            # Insert text before the ANSI code with previous tag
-            if match.start() > current_pos:
-                text = console_text[current_pos:match.start()]
-                if current_tag:
-                    self.console_output._textbox.insert(tki.END, text, current_tag)
-                else:
-                    self.console_output.insert(tki.END, text)
-
-            # Process the ANSI code to determine the new tag
-            code = match.group(1)
-
-            if code == '0' or code == '':
-                current_tag = None  # Reset to default
-            elif code.startswith('38;2;'):  # RGB foreground color
-                current_tag = self._process_rgb_code(code)
-            elif code in ansi_code_map:
-                current_tag = ansi_code_map[code]
+    def _insert_colored_text(self, line):
+        """Insert a pre-tokenized console line with appropriate formatting"""
+        textbox = self.console_output._textbox
+        for text, style in line.spans:
+            if style is None:
+                textbox.insert(tki.END, text)
+                continue
 
-            current_pos = match.end()
+            # RGB colors get a tag the first time we see them
+            if style.startswith('#') and style not in self.rgb_tags:
+                textbox.tag_configure(style, foreground=style)
+                self.rgb_tags.add(style)
 
-        # Insert any remaining text
-        if current_pos < len(console_text):
-            text = console_text[current_pos:]
-            if current_tag:
-                self.console_output._textbox.insert(tki.END, text, current_tag)
-            else:
-                self.console_output.insert(tki.END, text)
-
-    def _process_rgb_code(self, code):
-        """Process RGB ANSI color code (38;2;R;G;B)"""
-        try:
-            parts = code.split(';')
-            if len(parts) >= 5:  # Make sure we have all parts
-                r, g, b = int(parts[2]), int(parts[3]), int(parts[4])
-                rgb_tag = f"rgb_{r}_{g}_{b}"  # Create a unique tag name
-
-                # Check if we need to create this color tag
-                if rgb_tag not in self.rgb_tags:
-                    hex_color = f"#{r:02x}{g:02x}{b:02x}"
-                    self.console_output._textbox.tag_configure(rgb_tag, foreground=hex_color)
-                    self.rgb_tags.add(rgb_tag)  # Remember we created this tag
-
-                return rgb_tag
-        except Exception:
-            pass
-        return None
-
-    def _handle_console_scroll(self, current_pos):
-        """Handle auto-scrolling of console output"""
-        try:
-            # Check if current_pos is a tuple with at least 2 elements
-            if isinstance(current_pos, tuple) and len(current_pos) >= 2:
-                if current_pos[1] > 0.9:
-                    self.console_output.see(tki.END)
-                else:
-                    self.console_output.yview_moveto(current_pos[0])
-            else:
-                # Default to scrolling to the end
-                self.console_output.see(tki.END)
-        except (TypeError, IndexError):
-            # If any error occurs during scrolling, just scroll to end
-            self.console_output.see(tki.END)
+            textbox.insert(tki.END, text, style)
 
     def update_console_periodic(self):
         """Update console output periodically"""
@@ -3666,17 +3794,18 @@ class MCManager(tki.CTk):
             self.console_input.delete(0, tki.END)  # Clear input field
 
             # Update console after a short delay to see command output
-            self.after(200, self.update_console)
+            self.after(200, self._render_new_console_lines)
 
     def clear_console(self):
         """Clear console output"""
         self.console_output.configure(state="normal")
         self.console_output.delete("1.0", tki.END)
         self.console_output.configure(state="disabled")
+        self.console_line_count = 0
 
     def update_players(self):
         """Update players list with current online players"""
-        if not self.current_server:
+        if not self.current_server or not hasattr(self, 'players_list'):
             return
 
         # Initialize player_frames list if it doesn't exist
@@ -3837,7 +3966,7 @@ class MCManager(tki.CTk):
 
     def update_plugins(self):
         """Update the list of installed plugins"""
-        if not self.current_server:
+        if not self.current_server or not hasattr(self, 'plugins_list_frame'):
             return
 
         # Clear existing plugin frames
@@ -3948,9 +4077,11 @@ class MCManager(tki.CTk):
 
     def update_backups(self):
         """Update the list of server backups"""
-        if not self.current_server:
+        if not self.current_server or not hasattr(self, 'backups_list_frame'):
             return
 
+        self.update_next_backup()
+
         # Clear existing backup frames
         for widget in self.backups_list_frame.winfo_children():
             widget.destroy()
@@ -4028,9 +4159,24 @@ class MCManager(tki.CTk):
         self.current_server.set_backup_schedule(enabled, interval, max_backups)
         self.show_notification("Backup schedule saved")
 
-        # If enabled, schedule the first backup
-        if enabled:
-            self.current_server.schedule_next_backup()
+        # Schedule the next backup, or stop scheduled backups if disabled
+        self.current_server.schedule_next_backup()
+        # The scheduler works out the due time on its own thread
+        self.after(1000, self.update_next_backup)
+
+    def update_next_backup(self):
+        """Show when the scheduler makes the next backup of the current server"""
+        if not self.current_server or not hasattr(self, 'next_backup_label'):
+            return
+
+        due = backup_scheduler.next_backup(self.current_server)
+        if due is not None:
+            text = f"Next backup: {time.strftime('%Y-%m-%d %H:%M', time.localtime(due))}"
+        elif self.current_server.config.backup_schedule.get("enabled"):
+            text = "Next backup: being scheduled"
+        else:
+            text = "Next backup: not scheduled"
+        self.next_backup_label.configure(text=text)
 
     def save_settings(self):
         """Save server settings from all tabs"""
@@ -4142,14 +4288,27 @@ class MCManager(tki.CTk):
     def kick_player(self, player_name):
         """Kick a player from the server"""
         if self.current_server and self.current_server.is_running():
-            self.current_server.send_command(f"kick {player_name}")
-            self.after(500, self.update_players)  # Update player list after a delay
+            self._run_player_command(f"kick {player_name}")
 
     def ban_player(self, player_name:str):
         """Ban a player from the server"""
         if self.current_server and self.current_server.is_running():
-            self.current_server.send_command(f"ban {player_name}")
-            self.after(500, self.update_players)
+            self._run_player_command(f"ban {player_name}")
+
+    def _run_player_command(self, command:str):
+        """Run a command that changes who is online and refresh the player list once it's done"""
+        server = self.current_server
+
+        def run():
+            if server.rcon_command(command) is None:
+                # No RCON, fall back to the console and give the server a moment
+                server.send_command(command)
+                time.sleep(0.5)
+            else:
+                server.refresh_players()
+            self.after(0, self.update_players)
+
+        threading.Thread(target=run, daemon=True).start()
 
     def op_player(self, player_name:str):
         """Give operator status to a player"""
@@ -4323,5 +4482,10 @@ class MCManager(tki.CTk):
 
 args = sys.argv[1:]
 
-app = MCManager(args)
-app.run()
+if '-daemon' in args:
+    # Headless HTTP API instead of the UI or the stdin console
+    from api import run_daemon
+    run_daemon(args)
+else:
+    app = MCManager(args)
+    app.run()
@@ -0,0 +1,147 @@
+import numpy as np
+import threading
+import time
+
+
+class RingArray:
+    """Fixed-size NumPy ring of (timestamp, value) samples"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.count = 0
+        self.pos = 0  # Index the next sample goes to
+
+    def append(self, t, value):
+        self.times[self.pos] = t
+        self.values[self.pos] = value
+        self.pos = (self.pos + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def ordered(self):
+        """Get (times, values) oldest first"""
+        if self.count < self.capacity:
+            return self.times[:self.count].copy(), self.values[:self.count].copy()
+        return np.roll(self.times, -self.pos), np.roll(self.values, -self.pos)
+
+    def last(self):
+        """Get the newest (timestamp, value) or None"""
+        if not self.count:
+            return None
+        i = (self.pos - 1) % self.capacity
+        return self.times[i], self.values[i]
+
+
+class Rollup:
+    """Consolidate samples into fixed-width time buckets, like an RRD archive"""
+
+    def __init__(self, step, capacity):
+        self.step = step
+        self.avg = RingArray(capacity)
+        self.max = RingArray(capacity)
+        self._bucket = None
+        self._sum = 0.0
+        self._count = 0
+        self._max = 0.0
+
+    def add(self, t, value):
+        bucket = t - t % self.step
+        if bucket != self._bucket:
+            self._close()
+            self._bucket = bucket
+        self._sum += value
+        self._count += 1
+        self._max = value if self._count == 1 else max(self._max, value)
+
+    def _close(self):
+        """Store the finished bucket"""
+        if self._count:
+            self.avg.append(self._bucket, self._sum / self._count)
+            self.max.append(self._bucket, self._max)
+        self._sum = 0.0
+        self._count = 0
+
+
+class MetricSeries:
+    """Raw samples of one metric plus 1-minute, 10-minute and 1-hour rollups"""
+
+    # Resolution name -> (bucket seconds, buckets kept)
+    ROLLUPS = {
+        "1m": (60, 1440),     # 1 day
+        "10m": (600, 1008),   # 1 week
+        "1h": (3600, 8760)    # 1 year
+    }
+
+    def __init__(self, raw_capacity=7200):
+        self.raw = RingArray(raw_capacity)  # 1 hour at the sampler's 0.5 s interval
+        self.rollups = {name: Rollup(step, capacity) for name, (step, capacity) in self.ROLLUPS.items()}
+        self._lock = threading.Lock()
+
+    def add(self, t, value):
+        with self._lock:
+            self.raw.append(t, value)
+            for rollup in self.rollups.values():
+                rollup.add(t, value)
+
+    def last(self):
+        with self._lock:
+            return self.raw.last()
+
+    def window(self, seconds=None, resolution="raw", now=None):
+        """Get (times, values) of the last seconds at the given resolution"""
+        with self._lock:
+            ring = self.raw if resolution == "raw" else self.rollups[resolution].avg
+            times, values = ring.ordered()
+
+        if seconds is not None and len(times):
+            now = time.time() if now is None else now
+            start = np.searchsorted(times, now - seconds)
+            times, values = times[start:], values[start:]
+        return times, values
+
+    def covers(self, resolution, seconds):
+        """Check if a resolution keeps enough history to show the last seconds"""
+        if resolution == "raw":
+            # Assume the sampler's 0.5 s interval
+            return self.raw.capacity * 0.5 >= seconds
+        step, capacity = self.ROLLUPS[resolution]
+        return step * capacity >= seconds
+
+
+class MetricsStore:
+    """In-memory metric history of one server"""
+
+    SERIES = ("cpu", "rss", "players", "tps")
+
+    def __init__(self):
+        self.series = {name: MetricSeries() for name in self.SERIES}
+
+    def add(self, name, value, t=None):
+        """Record a sample, cpu is % of the whole host, rss is MB"""
+        self.series[name].add(time.time() if t is None else t, float(value))
+
+    def resolution_for(self, seconds, max_points=600):
+        """Pick the finest resolution that covers the range without drawing too many points"""
+        for resolution, step in (("raw", 0.5), ("1m", 60), ("10m", 600), ("1h", 3600)):
+            if seconds / step <= max_points and self.series["cpu"].covers(resolution, seconds):
+                return resolution
+        return "1h"
+
+    def window(self, name, seconds=None, resolution=None, now=None):
+        """Get (times, values) of a metric over the last seconds"""
+        if resolution is None:
+            resolution = "raw" if seconds is None else self.resolution_for(seconds)
+        return self.series[name].window(seconds, resolution, now)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metrics_store(server_name):
+    """Get the metric history of a server, kept across stops and Server objects"""
+    with _stores_lock:
+        if server_name not in _stores:
+            _stores[server_name] = MetricsStore()
+        return _stores[server_name]
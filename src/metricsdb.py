@@ -0,0 +1,169 @@
+import threading
+import sqlite3
+import time
+import csv
+import os
+
+DEFAULT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "servers", "metrics.sqlite3"))
+
+# Table -> (bucket seconds, seconds kept or None for forever)
+TABLES = {
+    "samples": (None, 24 * 3600),       # Raw samples for 24 h
+    "rollup_1m": (60, 30 * 86400),      # 1-minute rollups for 30 days
+    "rollup_1h": (3600, None)           # Hourly rollups forever
+}
+
+
+class MetricsDatabase:
+    """
+    Persistent SQLite time series of server metrics.
+
+    record() only appends to an in-memory batch. A writer thread commits the
+    batch and its rollups in one transaction every flush_interval seconds
+    (WAL, synchronous=NORMAL, so there is no fsync per sample) and applies the
+    retention policy in TABLES.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, flush_interval=5.0, prune_interval=600.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.prune_interval = prune_interval
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_prune = 0
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS samples (server TEXT NOT NULL, metric TEXT NOT NULL, ts REAL NOT NULL, value REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS samples_range ON samples (server, metric, ts)")
+        for table in ("rollup_1m", "rollup_1h"):
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "server TEXT NOT NULL, metric TEXT NOT NULL, ts INTEGER NOT NULL, "
+                "avg REAL NOT NULL, min REAL NOT NULL, max REAL NOT NULL, count INTEGER NOT NULL, "
+                "PRIMARY KEY (server, metric, ts)) WITHOUT ROWID"
+            )
+        return db
+
+    def record(self, server, metric, t, value):
+        """Queue a sample, it is written with the next batch"""
+        with self._lock:
+            self._pending.append((server, metric, t, float(value)))
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        db = self._connect()
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self._flush(db)
+                if time.time() - self._last_prune > self.prune_interval:
+                    self._prune(db)
+            except Exception as e:
+                print(f"Error writing metrics: {str(e)}")
+
+    def flush(self):
+        """Write the pending batch now (e.g. before exiting)"""
+        db = self._connect()
+        try:
+            self._flush(db)
+        finally:
+            db.close()
+
+    def _flush(self, db):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        # Aggregate the batch per bucket in Python, then merge into the stored rollups
+        rollups = {table: {} for table, (step, _) in TABLES.items() if step}
+        for server, metric, t, value in batch:
+            for table, buckets in rollups.items():
+                step = TABLES[table][0]
+                key = (server, metric, int(t - t % step))
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = [value, value, value, 1]  # sum, min, max, count
+                else:
+                    bucket[0] += value
+                    bucket[1] = min(bucket[1], value)
+                    bucket[2] = max(bucket[2], value)
+                    bucket[3] += 1
+
+        with db:
+            db.executemany("INSERT INTO samples (server, metric, ts, value) VALUES (?, ?, ?, ?)", batch)
+            for table, buckets in rollups.items():
+                db.executemany(
+                    f"INSERT INTO {table} (server, metric, ts, avg, min, max, count) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (server, metric, ts) DO UPDATE SET "
+                    "avg = (avg * count + excluded.avg * excluded.count) / (count + excluded.count), "
+                    "min = MIN(min, excluded.min), max = MAX(max, excluded.max), count = count + excluded.count",
+                    [(*key, total / count, low, high, count) for key, (total, low, high, count) in buckets.items()]
+                )
+
+    def _prune(self, db):
+        """Drop rows older than each table's retention"""
+        now = time.time()
+        with db:
+            for table, (_, keep) in TABLES.items():
+                if keep is not None:
+                    db.execute(f"DELETE FROM {table} WHERE ts < ?", (now - keep,))
+        self._last_prune = now
+
+    def resolution_for(self, start, end, max_points=2000):
+        """Pick the finest table that still has data for start and isn't too dense"""
+        now = time.time()
+        if now - start <= TABLES["samples"][1] and (end - start) / 0.5 <= max_points:
+            return "samples"
+        if now - start <= TABLES["rollup_1m"][1] and (end - start) / 60 <= max_points:
+            return "rollup_1m"
+        return "rollup_1h"
+
+    def query(self, server, metric, start, end=None, table=None):
+        """Get [(ts, value), ...] of a metric between start and end, rollups return their average"""
+        end = time.time() if end is None else end
+        table = table or self.resolution_for(start, end)
+        column = "value" if table == "samples" else "avg"
+
+        db = self._connect()
+        try:
+            return db.execute(
+                f"SELECT ts, {column} FROM {table} WHERE server = ? AND metric = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (server, metric, start, end)
+            ).fetchall()
+        finally:
+            db.close()
+
+    def export_csv(self, path, server, start=0, end=None, table="rollup_1m"):
+        """Write every metric of a server between start and end to a CSV file"""
+        end = time.time() if end is None else end
+        column = "value" if table == "samples" else "avg"
+
+        db = self._connect()
+        try:
+            rows = db.execute(
+                f"SELECT ts, metric, {column} FROM {table} WHERE server = ? AND ts BETWEEN ? AND ? ORDER BY ts, metric",
+                (server, start, end)
+            )
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["timestamp", "metric", "value"])
+                count = 0
+                for row in rows:
+                    writer.writerow(row)
+                    count += 1
+            return count
+        finally:
+            db.close()
+
+
+metrics_db = MetricsDatabase()
@@ -0,0 +1,132 @@
+import threading
+import tempfile
+import os
+
+
+class ServerProperties:
+    """
+    Parsed server.properties of one server.
+
+    The file is parsed once into a dict and only re-read when its mtime or size
+    changes. Writes keep the original line order and comments and replace the
+    file atomically.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lines = []    # Raw lines of the file, without line endings
+        self._values = {}   # Key -> value
+        self._index = {}    # Key -> index into _lines
+        self._stamp = None  # (mtime_ns, size) of the version we parsed
+        self._lock = threading.RLock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _reload_if_changed(self):
+        """Re-parse the file if it changed on disk since we last read it"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+
+        lines = []
+        if stamp is not None:
+            try:
+                with open(self.path, 'r', encoding='utf-8', errors='replace') as f:
+                    lines = f.read().splitlines()
+            except OSError as e:
+                print(f"Failed to read server.properties: {str(e)}")
+
+        values = {}
+        index = {}
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            if stripped and not stripped.startswith(('#', '!')) and '=' in stripped:
+                key, value = stripped.split('=', 1)
+                values[key.strip()] = value.strip()
+                index[key.strip()] = i
+
+        self._lines = lines
+        self._values = values
+        self._index = index
+        self._stamp = stamp
+
+    def exists(self):
+        """Check if the properties file exists"""
+        return self._file_stamp() is not None
+
+    def get(self, key, default=None):
+        """Get a property value as a string"""
+        with self._lock:
+            self._reload_if_changed()
+            return self._values.get(key, default)
+
+    def get_int(self, key, default=0):
+        """Get a property value as an int, default if missing or not a number"""
+        try:
+            return int(self.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    def get_bool(self, key, default=False):
+        """Get a property value as a bool"""
+        value = self.get(key)
+        if value is None:
+            return default
+        return value.lower() == 'true'
+
+    def as_dict(self):
+        """Get a copy of all properties in file order"""
+        with self._lock:
+            self._reload_if_changed()
+            return dict(self._values)
+
+    def __contains__(self, key):
+        with self._lock:
+            self._reload_if_changed()
+            return key in self._values
+
+    def update(self, values:dict):
+        """Set several properties and write the file once"""
+        with self._lock:
+            self._reload_if_changed()
+            for key, value in values.items():
+                value = str(value).lower() if isinstance(value, bool) else str(value)
+                line = f"{key}={value}"
+                if key in self._index:
+                    self._lines[self._index[key]] = line
+                else:
+                    self._index[key] = len(self._lines)
+                    self._lines.append(line)
+                self._values[key] = value
+            self.save()
+
+    def set(self, key, value):
+        """Set a single property and write the file"""
+        self.update({key: value})
+
+    def save(self):
+        """Write the properties back, replacing the file atomically"""
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            fd, temp_path = tempfile.mkstemp(prefix=".server.properties.", dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write("\n".join(self._lines) + "\n")
+                # mkstemp creates the file as 0600, keep the permissions of the original
+                try:
+                    os.chmod(temp_path, os.stat(self.path).st_mode & 0o777)
+                except OSError:
+                    os.chmod(temp_path, 0o644)
+                os.replace(temp_path, self.path)
+            except Exception:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+                raise
+            self._stamp = self._file_stamp()
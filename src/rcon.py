@@ -0,0 +1,190 @@
+from concurrent.futures import Future
+import threading
+import itertools
+import socket
+import struct
+
+# Packet types
+TYPE_RESPONSE = 0
+TYPE_COMMAND = 2
+TYPE_AUTH_RESPONSE = 2
+TYPE_LOGIN = 3
+# Not a real request type. The server answers it with "Unknown request c8", and because
+# requests are handled in order that answer marks the end of the previous command's output.
+TYPE_END = 200
+
+MAX_COMMAND = 1446  # Longest command body the server accepts
+
+
+class RconError(Exception):
+    """RCON connection, login or command failed"""
+
+
+class RconClient:
+    """
+    Persistent, authenticated RCON connection to one server.
+
+    Every command is followed by an end marker packet, so responses split over
+    several packets can be joined and any number of commands can be in flight
+    at once (pipelining). A reader thread matches responses to request IDs and
+    completes their futures. A lost connection fails the pending commands and
+    is reopened by the next command.
+    """
+
+    def __init__(self, host, port, password, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.timeout = timeout
+        self._sock = None
+        self._ids = itertools.count(1)
+        self._pending = {}  # Request ID -> (future, response parts)
+        self._ends = {}     # End marker ID -> request ID
+        self._lock = threading.RLock()
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def connect(self):
+        """Open and authenticate the connection if it isn't already"""
+        with self._lock:
+            if self._sock:
+                return
+
+            sock = socket.create_connection((self.host, self.port), self.timeout)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                reader = sock.makefile('rb')
+
+                # Log in before the reader thread takes over the socket
+                login_id = self._next_id()
+                sock.sendall(_packet(login_id, TYPE_LOGIN, self.password))
+                while True:
+                    request_id, packet_type, _ = _read_packet(reader)
+                    if packet_type == TYPE_AUTH_RESPONSE:
+                        break
+                if request_id == -1:
+                    raise RconError("RCON login failed, wrong password")
+            except Exception:
+                sock.close()
+                raise
+
+            sock.settimeout(None)
+            self._sock = sock
+            threading.Thread(target=self._read_loop, args=(sock, reader), daemon=True).start()
+
+    def close(self):
+        """Close the connection, pending commands fail"""
+        with self._lock:
+            sock = self._sock
+        if sock:
+            self._drop(sock, RconError("RCON connection closed"))
+
+    def submit(self, command:str):
+        """Send a command without waiting, the future's result is the response text"""
+        body = command.encode('utf-8')
+        if len(body) > MAX_COMMAND:
+            raise RconError(f"Command too long for RCON ({len(body)} > {MAX_COMMAND} bytes)")
+
+        self.connect()
+        future = Future()
+        with self._lock:
+            sock = self._sock
+            if not sock:
+                raise RconError("RCON connection closed")
+
+            request_id = self._next_id()
+            end_id = self._next_id()
+            self._pending[request_id] = (future, [])
+            self._ends[end_id] = request_id
+            try:
+                sock.sendall(_packet(request_id, TYPE_COMMAND, body) + _packet(end_id, TYPE_END, b""))
+            except OSError as e:
+                self._drop(sock, RconError(f"RCON connection lost: {e}"))
+        return future
+
+    def command(self, command:str, timeout:float | None = None):
+        """Run a command and return its response text"""
+        return self.wait([self.submit(command)], timeout)[0]
+
+    def command_many(self, commands:list[str], timeout:float | None = None):
+        """Send all commands back to back and return their responses in order"""
+        return self.wait([self.submit(command) for command in commands], timeout)
+
+    def wait(self, futures:list[Future], timeout:float | None = None):
+        """Get the responses of submitted commands, commands that time out are forgotten"""
+        try:
+            return [future.result(timeout or self.timeout) for future in futures]
+        except Exception:
+            # A late response to a forgotten command is simply ignored
+            self.forget(futures)
+            raise
+
+    def forget(self, futures:list[Future]):
+        """Stop waiting for the responses of commands that haven't finished"""
+        futures = {id(future) for future in futures if not future.done()}
+        if not futures:
+            return
+        with self._lock:
+            stale = {request_id for request_id, (future, _) in self._pending.items() if id(future) in futures}
+            for request_id in stale:
+                self._pending.pop(request_id)[0].cancel()
+            self._ends = {end_id: request_id for end_id, request_id in self._ends.items() if request_id not in stale}
+
+    def _next_id(self):
+        # IDs are signed 32 bit and -1 means failed login
+        return next(self._ids) % 0x7FFFFFFF or next(self._ids)
+
+    def _read_loop(self, sock, reader):
+        """Collect response packets and complete their commands"""
+        try:
+            while True:
+                request_id, _, body = _read_packet(reader)
+                with self._lock:
+                    if request_id in self._pending:
+                        self._pending[request_id][1].append(body)
+                    elif request_id in self._ends:
+                        future, parts = self._pending.pop(self._ends.pop(request_id), (None, None))
+                        if future:
+                            future.set_result(b"".join(parts).decode('utf-8', errors='replace'))
+        except Exception as e:
+            self._drop(sock, e if isinstance(e, RconError) else RconError(f"RCON connection lost: {e}"))
+
+    def _drop(self, sock, error):
+        """Close a connection and fail everything that was waiting on it"""
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+            pending, self._pending, self._ends = self._pending, {}, {}
+        try:
+            sock.close()
+        except OSError:
+            pass
+        for future, _ in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+
+def _packet(request_id, packet_type, body):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    payload = struct.pack('<ii', request_id, packet_type) + body + b"\x00\x00"
+    return struct.pack('<i', len(payload)) + payload
+
+
+def _read_exact(reader, size):
+    data = reader.read(size)
+    if len(data) < size:
+        raise RconError("RCON connection closed by server")
+    return data
+
+
+def _read_packet(reader):
+    """Read one packet as (request ID, type, body bytes)"""
+    length, = struct.unpack('<i', _read_exact(reader, 4))
+    if length < 10 or length > 4096 + 10:
+        raise RconError(f"Invalid RCON packet length {length}")
+    request_id, packet_type = struct.unpack('<ii', _read_exact(reader, 8))
+    body = _read_exact(reader, length - 8)[:-2]  # Strip the two null terminators
+    return request_id, packet_type, body
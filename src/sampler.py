@@ -0,0 +1,138 @@
+from metrics import get_metrics_store
+from metricsdb import metrics_db
+import threading
+import psutil
+import time
+
+
+class _Entry:
+    """Cached psutil handles of one server process tree"""
+
+    def __init__(self, server):
+        self.server = server
+        self.pid = server.process.pid
+        self.proc = psutil.Process(self.pid)
+        self.children = {}  # pid -> psutil.Process, kept so cpu_percent deltas survive refreshes
+        self.ticks = 0
+
+
+class ResourceSampler:
+    """
+    Sample CPU and RAM of every running server in a single pass on one thread.
+
+    Process handles are cached so cpu_percent() can work from the delta since
+    the previous pass instead of blocking, and the child process set is only
+    refreshed every children_every passes.
+    """
+
+    def __init__(self, interval=0.5, children_every=20):
+        self.interval = interval
+        self.children_every = children_every
+        self._entries = {}  # id(server) -> _Entry
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.cpu_count = psutil.cpu_count() or 1
+
+    def register(self, server):
+        """Start sampling a server whose process was just started"""
+        try:
+            entry = _Entry(server)
+            entry.proc.cpu_percent(None)  # Prime the delta
+        except Exception as e:
+            print(f"Failed to monitor server: {str(e)}")
+            return
+
+        with self._lock:
+            self._entries[id(server)] = entry
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def unregister(self, server):
+        """Stop sampling a server"""
+        with self._lock:
+            self._entries.pop(id(server), None)
+
+    def _run(self):
+        while True:
+            start = time.time()
+
+            with self._lock:
+                entries = list(self._entries.values())
+
+            if not entries:
+                # Nothing to do until a server gets registered
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+
+            for entry in entries:
+                server = entry.server
+                if not server._is_running or not server.process or server.process.pid != entry.pid:
+                    self._finish(entry)
+                    continue
+
+                try:
+                    self._sample(entry)
+                except psutil.NoSuchProcess:
+                    self._finish(entry)
+                except Exception:
+                    pass
+
+            time.sleep(max(0, self.interval - (time.time() - start)))  # Sleep to maintain loop interval
+
+    def _sample(self, entry):
+        """Read CPU and RAM of one process tree"""
+        # Java may have child processes, only walk the tree once in a while
+        if entry.ticks % self.children_every == 0:
+            children = {}
+            for child in entry.proc.children(recursive=True):
+                children[child.pid] = entry.children.get(child.pid, child)
+            entry.children = children
+        entry.ticks += 1
+
+        with entry.proc.oneshot():
+            cpu_usage = entry.proc.cpu_percent(None)
+            ram_usage = entry.proc.memory_info().rss
+
+        for pid, child in list(entry.children.items()):
+            try:
+                with child.oneshot():
+                    cpu_usage += child.cpu_percent(None)
+                    ram_usage += child.memory_info().rss
+            except psutil.Error:
+                entry.children.pop(pid, None)
+
+        entry.server.cpu_usage = cpu_usage
+        entry.server.ram_usage = ram_usage / (1024 * 1024)  # MB
+
+        # Keep history for the dashboard charts
+        now = time.time()
+        store = get_metrics_store(entry.server.name)
+        samples = {
+            "cpu": cpu_usage / self.cpu_count,
+            "rss": entry.server.ram_usage,
+            "players": len(entry.server.players)
+        }
+        for metric, value in samples.items():
+            store.add(metric, value, now)
+            metrics_db.record(entry.server.name, metric, now, value)
+
+    def _finish(self, entry):
+        """Stop sampling a server that exited and make sure its process is gone"""
+        with self._lock:
+            # A restart may already have registered the new process
+            if self._entries.get(id(entry.server)) is entry:
+                del self._entries[id(entry.server)]
+
+        process = entry.server.process
+        if process and process.pid == entry.pid:
+            try:
+                process.terminate()
+            except Exception:
+                ...
+
+
+resource_sampler = ResourceSampler()
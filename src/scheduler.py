@@ -0,0 +1,227 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import platform
+import random
+import ctypes
+import time
+import sys
+import os
+
+SCHEDULED_PREFIX = "scheduled_"  # Only backups named like this are ever pruned
+RETRY_DELAY = 600  # Seconds before a failed backup is tried again
+
+# Retention period -> strftime bucket, the newest backup of each bucket is kept
+RETENTION_PERIODS = {
+    "hourly": "%Y%m%d%H",
+    "daily": "%Y%m%d",
+    "weekly": "%G%V"
+}
+
+# ioprio_set isn't in the os module, so it goes through syscall(2)
+IOPRIO_SET = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289, "aarch64": 30, "arm64": 30}
+IOPRIO_WHO_PROCESS = 1
+IOPRIO_CLASS_IDLE = 3
+THREAD_MODE_BACKGROUND_BEGIN = 0x00010000
+
+
+def lower_thread_priority(nice=19):
+    """
+    Run the calling thread at the lowest CPU priority and the idle I/O class.
+
+    On Linux both are per thread and inherited by threads it starts, so the
+    backup thread pools are covered too. Windows puts the thread in
+    background mode, which lowers its CPU and I/O priority.
+    """
+    if os.name == 'nt':
+        kernel32 = ctypes.windll.kernel32
+        if not kernel32.SetThreadPriority(kernel32.GetCurrentThread(), THREAD_MODE_BACKGROUND_BEGIN):
+            print("Could not lower the backup thread priority")
+        return
+
+    # Elsewhere setpriority and ioprio_set can't target a single thread
+    if not sys.platform.startswith('linux'):
+        return
+
+    thread_id = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, thread_id, nice)
+    except OSError as e:
+        print(f"Could not lower the backup thread CPU priority: {str(e)}")
+
+    number = IOPRIO_SET.get(platform.machine().lower())
+    if number is None:
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(number, IOPRIO_WHO_PROCESS, thread_id, IOPRIO_CLASS_IDLE << 13) != 0:
+        print(f"Could not lower the backup thread I/O priority: {os.strerror(ctypes.get_errno())}")
+
+
+def run_low_priority(func, *args, **kwargs):
+    """Run func on a fresh thread with lower_thread_priority() and return its result"""
+    with ThreadPoolExecutor(1, thread_name_prefix="backup-idle", initializer=lower_thread_priority) as pool:
+        return pool.submit(func, *args, **kwargs).result()
+
+
+def expired_backups(backups, max_backups=-1, retention=None):
+    """
+    Names of the backups a schedule doesn't keep, from Server.get_backups() dicts.
+
+    retention keeps the newest backup of each of the last N hours, days and
+    weeks that have backups, e.g. {"hourly": 24, "daily": 7, "weekly": 4}.
+    Without it every backup is kept. Of those only the newest max_backups
+    stay, -1 keeps them all.
+    """
+    backups = sorted(backups, key=lambda backup: backup["timestamp"], reverse=True)
+
+    if retention:
+        keep = {backup["name"] for backup in backups[:1]}
+        for period, bucket_format in RETENTION_PERIODS.items():
+            buckets = set()
+            for backup in backups:
+                if len(buckets) >= retention.get(period, 0):
+                    break
+                bucket = time.strftime(bucket_format, time.localtime(backup["timestamp"]))
+                if bucket not in buckets:
+                    buckets.add(bucket)
+                    keep.add(backup["name"])
+        kept = [backup for backup in backups if backup["name"] in keep]
+    else:
+        kept = backups
+
+    if max_backups is not None and max_backups > 0:
+        kept = kept[:max_backups]
+
+    kept_names = {backup["name"] for backup in kept}
+    return [backup["name"] for backup in backups if backup["name"] not in kept_names]
+
+
+class BackupScheduler:
+    """
+    Makes the scheduled backups of every server from one thread.
+
+    A server is due interval hours after its newest scheduled backup, plus a
+    random jitter so servers with the same interval don't all back up at
+    once. Backups run one at a time and old scheduled backups are pruned
+    after each one. Backups made by hand are never deleted.
+
+    The snapshot, which has saving turned off, runs at normal priority so it
+    stays short, only compressing and pruning run at low priority.
+    """
+
+    def __init__(self, jitter=0.1, max_jitter=300):
+        self.jitter = jitter          # Fraction of the interval added at random
+        self.max_jitter = max_jitter  # Upper bound of the jitter in seconds
+        self._entries = {}  # Server directory -> [due time or None, server]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def schedule(self, server):
+        """(Re)schedule a server from its backup_schedule setting, or drop it if that's disabled"""
+        schedule = server.config.backup_schedule
+        key = os.path.abspath(server.base_dir)
+
+        if not schedule.get("enabled") or not float(schedule.get("interval") or 0) > 0:
+            self.unschedule(server)
+            return
+
+        with self._lock:
+            # Keep the object that runs the server, only it can pause saving for the snapshot
+            current = self._entries.get(key)
+            if current and current[1].is_running() and not server.is_running():
+                server = current[1]
+            # The due time needs the backup list, so the scheduler thread works it out
+            self._entries[key] = [None, server]
+
+            if not self._thread or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def unschedule(self, server):
+        """Stop making scheduled backups of a server"""
+        with self._lock:
+            self._entries.pop(os.path.abspath(server.base_dir), None)
+
+    def next_backup(self, server):
+        """When the next scheduled backup of a server is due, None if it isn't scheduled (yet)"""
+        with self._lock:
+            entry = self._entries.get(os.path.abspath(server.base_dir))
+            return entry[0] if entry else None
+
+    def _run(self):
+        while True:
+            # Cleared first so a schedule() call during this round isn't missed
+            self._wakeup.clear()
+
+            with self._lock:
+                entries = list(self._entries.items())
+
+            for key, (due, server) in entries:
+                if due is None:
+                    self._set_due(key, server, self._next_due(server))
+
+            with self._lock:
+                pending = [(due, key, server) for key, (due, server) in self._entries.items() if due is not None]
+
+            if not pending:
+                self._wakeup.wait()
+                continue
+
+            due, key, server = min(pending, key=lambda item: item[0])
+            delay = due - time.time()
+            if delay > 0:
+                self._wakeup.wait(delay)
+                continue
+
+            self._set_due(key, server, self._backup(server))
+
+    def _set_due(self, key, server, due):
+        with self._lock:
+            entry = self._entries.get(key)
+            # Unless the server was rescheduled or dropped in the meantime
+            if entry and entry[1] is server:
+                entry[0] = due
+
+    def _next_due(self, server):
+        """Interval hours after the newest scheduled backup, right away if that's overdue"""
+        interval = float(server.config.backup_schedule.get("interval") or 0) * 3600
+        try:
+            last = max(
+                (backup["timestamp"] for backup in server.get_backups() if backup["name"].startswith(SCHEDULED_PREFIX)),
+                default=0
+            )
+        except Exception as e:
+            print(f"Could not list backups of {server.name}: {str(e)}")
+            last = 0
+        return max(last + interval, time.time()) + random.uniform(0, min(interval * self.jitter, self.max_jitter))
+
+    def _backup(self, server):
+        """Make a scheduled backup and prune old ones, returns when the next one is due"""
+        name = f"{SCHEDULED_PREFIX}{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        print(f"Starting scheduled backup {name} of {server.name}")
+        try:
+            success = server.create_backup(name, low_priority=True)
+        except Exception as e:
+            print(f"Scheduled backup of {server.name} failed: {str(e)}")
+            success = False
+        if not success:
+            return time.time() + RETRY_DELAY
+
+        try:
+            run_low_priority(self.prune, server)
+        except Exception as e:
+            print(f"Pruning backups of {server.name} failed: {str(e)}")
+        return self._next_due(server)
+
+    def prune(self, server):
+        """Delete the scheduled backups of a server its schedule no longer keeps"""
+        schedule = server.config.backup_schedule
+        backups = [backup for backup in server.get_backups() if backup["name"].startswith(SCHEDULED_PREFIX)]
+        for name in expired_backups(backups, schedule.get("max_backups", -1), schedule.get("retention")):
+            print(f"Deleting old backup {name} of {server.name}")
+            server.delete_backup(name)
+
+
+backup_scheduler = BackupScheduler()
@@ -1,14 +1,26 @@
-from mcstatus import JavaServer
+from backups import BackupStore, snapshot_files, valid_backup_name, walk_files, unchanged
+from console import ConsoleBuffer, FloodGuard, export_lines, parse_ansi
+from scheduler import backup_scheduler, run_low_priority
+from properties import ServerProperties
+from rcon import RconClient, RconError
+from metrics import get_metrics_store
+from concurrent.futures import Future
+from archive import ParallelZipWriter
+from sampler import resource_sampler
+from config import get_config_store
+from commands import CommandWriter
+from ioloop import console_reader
+from metricsdb import metrics_db
+from status import StatusPoller
 from datetime import datetime
 import subprocess
 import threading
 import traceback
-import zipfile
-import psutil
+import secrets
 import shutil
 import ctypes
+import events
 import time
-import json
 import glob
 import re
 import os
@@ -38,31 +50,77 @@ if is_admin():
     print('Enabling large pages because we are running as admin.')
 
 
+# Responses of /list, /tps (Paper, Purpur, ...) and /tick query (vanilla 1.20.3+)
+LIST_PATTERN = re.compile(r'There are (?P<online>\d+)(?: of a max(?: of)? |/)(?P<max>\d+) players online:(?P<names>.*)', re.DOTALL)
+TPS_PATTERN = re.compile(r'TPS from last [^:]*:\s*\*?(?P<tps>\d+(?:\.\d+)?)')
+TICK_QUERY_PATTERN = re.compile(r'Target tick rate: (?P<rate>\d+(?:\.\d+)?).*?Average time per tick: (?P<mspt>\d+(?:\.\d+)?)ms', re.DOTALL)
+
+
+def _describe_methods(methods):
+    """Turn a snapshot_files() method count into text like 3 reflink, 2 kept"""
+    return ', '.join(f'{count} {method}' for method, count in methods.items()) or 'no files copied'
+
+
+def strip_formatting(text:str):
+    """Remove legacy color codes like §a"""
+    return re.sub(r'\u00a7.', '', text)
+
+
 class Server:
-    def __init__(self, name, max_ram=4096):
+    def __init__(self, name, max_ram=4096, status_ttl=5.0):
         self.name = name
         self.base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "servers", name))
         self.jar_path = self._find_server_jar()
         self.process = None
-        self.console_output = []
+        self.command_writer = None
+        self.console_output = ConsoleBuffer(5000)
+        self.flood_guard = FloodGuard()
+        self.raw_log = None  # Unfiltered console output of the current run
+        self._last_plain = ""
         self._is_running = False
         self.start_time = None
-        self._monitor_thread = None
-        self._console_lock = threading.Lock()
 
         # Create server directory if it doesn't exist
         if not os.path.exists(self.base_dir):
             os.makedirs(self.base_dir)
 
+        # Parsed once, re-read only when the file changes
+        self.properties = ServerProperties(os.path.join(self.base_dir, "server.properties"))
+        self.config = get_config_store(os.path.join(self.base_dir, "server_config.json"))
+
         # Resource monitoring data
         self.cpu_usage = 0
         self.ram_usage = 0
         self.max_ram = max_ram # MB
+        self.last_backup = None  # Stats of the last backup made by this object
+        self._backup_lock = threading.Lock()  # One backup of this server at a time
 
-        # Player tracking
-        self.players = []
+        # Player tracking, kept up to date from join/leave lines in the console
+        self.players = {}  # Player name -> join time
         self.status = None
         self.max_players = 0
+        self.status_poller = StatusPoller(self, ttl=status_ttl)
+
+        # Console events
+        self.ready_time = None  # Seconds the server reported in "Done (Xs)!"
+        self.plugin_versions = {}
+        self.last_lag = None  # (ms behind, ticks behind, time) of the last "Can't keep up!"
+        self.events = events.ConsoleEventDispatcher()
+        self.events.subscribe(events.EVENT_JOIN, self._on_player_join)
+        self.events.subscribe(events.EVENT_LEAVE, self._on_player_leave)
+        self.events.subscribe(events.EVENT_KICK, self._on_player_leave)
+        self.events.subscribe(events.EVENT_READY, self._on_ready)
+        self.events.subscribe(events.EVENT_PLUGIN_ENABLED, self._on_plugin_enabled)
+        self.events.subscribe(events.EVENT_TPS_WARNING, self._on_tps_warning)
+
+        # RCON, connected once the server is ready
+        self.rcon = None
+        self.rcon_poll_interval = 5  # Seconds between player list / TPS refreshes
+        self._run_id = 0          # Counts starts, so threads of a previous run can tell they're stale
+        self._polled_run = None   # Run whose RCON poll thread was started
+        self.tps = None
+        self._rcon_error = None
+        self._tps_command = "tps"  # Switched to "tick query" on servers without /tps
 
     def _find_server_jar(self):
         """Find a server jar file in the server directory"""
@@ -92,6 +150,8 @@ class Server:
             # Get memory settings from server.properties or use default
             memory = self._get_memory_setting()
 
+            self._ensure_rcon_enabled()
+
             print(f'Starting server with {memory} MB')
 
             # Build Java command
@@ -109,20 +169,43 @@ class Server:
                 cwd=self.base_dir,
                 stdin=subprocess.PIPE,
                 stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                stderr=subprocess.STDOUT
             )
 
+            # Commands are written from their own thread so a full pipe never blocks the caller
+            self.command_writer = CommandWriter(self.process.stdin, rate=self.config.get("command_rate"))
+
             self._is_running = True
+            self._run_id += 1
             self.start_time = time.time()
+            self.players = {}
+            self.ready_time = None
+            self.tps = None
 
             # Start monitoring thread
             self._start_monitor()
 
-            # Start console reader thread
-            threading.Thread(target=self._read_console, daemon=True).start()
+            # Full console output, the in-memory buffer collapses repeated lines
+            # Keep the previous run's log, after a crash that's the one worth reading
+            raw_log_path = os.path.join(self.base_dir, "logs", "manager-console.log")
+            os.makedirs(os.path.dirname(raw_log_path), exist_ok=True)
+            if os.path.exists(raw_log_path):
+                os.replace(raw_log_path, f"{raw_log_path}.1")
+            self.raw_log = open(
+                raw_log_path,
+                'w',
+                encoding='utf-8',
+                buffering=1024 * 1024
+            )
+            self.flood_guard = FloodGuard()
+
+            # Console output is read by the shared I/O loop
+            console_reader.register(
+                self.process.stdout,
+                lambda line: self._ingest_line(line.strip()),
+                self._on_console_closed,
+                self._on_console_idle
+            )
 
             return True
         except Exception as e:
@@ -175,102 +258,292 @@ class Server:
         return self._is_running
 
     def send_command(self, command:str):
-        """Send a command to the server console"""
-        if not self._is_running or not self.process:
-            return False
+        """Queue a command for the server console, False if the server isn't running or the queue is full"""
+        future = self.submit_command(command)
+        return not (future.done() and future.exception())
+
+    def submit_command(self, command:str):
+        """
+        Queue a command for the server console without waiting for the pipe.
+
+        Returns:
+            Future: Resolves to True once written, or fails with the write error
+        """
+        writer = self.command_writer
+        if not self._is_running or not writer:
+            future = Future()
+            future.set_exception(RuntimeError("Server is not running"))
+            return future
+        return writer.submit(command)
 
+    def get_console(self):
+        """Get the console output"""
+        # Limit to last 1000 lines
+        return "\n".join(line.text for line in self.console_output.tail(1000))
+
+    def get_console_since(self, seq:int, limit:int | None = None):
+        """
+        Get console lines added after a previous call.
+
+        Args:
+            seq: Cursor returned by the previous call, 0 to start from the oldest buffered line
+            limit: Only return up to this many of the newest lines
+
+        Returns:
+            tuple: (new ConsoleLine entries, new cursor)
+        """
+        return self.console_output.since(seq, limit)
+
+    def subscribe_console(self, seq:int | None = None, maxlen:int = 1000):
+        """
+        Get a ConsoleSubscriber that new console lines are pushed to.
+
+        Args:
+            seq: Also queue buffered lines from this sequence number on, None for only new lines
+            maxlen: Queue size, the oldest lines are dropped when the subscriber falls behind
+        """
+        return self.console_output.subscribe(seq, maxlen)
+
+    def unsubscribe_console(self, subscriber):
+        """Stop pushing console lines to a subscriber"""
+        self.console_output.unsubscribe(subscriber)
+
+    def search_console(self, query:str, limit:int = 100):
+        """Find the newest buffered console lines containing query (case-insensitive)"""
+        query = query.lower()
+        matches = [line for line in self.console_output if query in line.plain.lower()]
+        return matches[-limit:]
+
+    def export_console(self, path:str):
+        """Write the buffered console output to path, colored HTML for .html files and plain text otherwise"""
         try:
-            self.process.stdin.write(f"{command}\n")
-            self.process.stdin.flush()
+            export_lines(list(self.console_output), path)
             return True
         except Exception as e:
-            print(f"Failed to send command: {str(e)}")
+            print(f"Failed to export console: {str(e)}")
             return False
 
-    def get_console(self):
-        """Get the console output"""
-        with self._console_lock:
-            return "\n".join(self.console_output[-1000:])  # Limit to last 1000 lines
-
-    def _read_console(self):
-        """Read console output from the server process and track player activity"""
-        if not self.process:
+    def _on_console_closed(self):
+        """The server process closed its output, so it has exited"""
+        self._is_running = False
+        summary = self.flood_guard.flush()
+        if summary:
+            self.console_output.append(parse_ansi(summary))
+        if self.raw_log:
+            self.raw_log.close()
+            self.raw_log = None
+        if self.command_writer:
+            self.command_writer.close()
+        if self.rcon:
+            self.rcon.close()
+
+    def _on_console_idle(self):
+        """Report a flood that ended on a quiet console, nothing else would show its count"""
+        summary = self.flood_guard.flush_idle()
+        if summary:
+            self.console_output.append(parse_ansi(summary))
+
+    def _ingest_line(self, line:str):
+        """Store a console line and dispatch the events it contains"""
+        # Everything goes to disk, only the in-memory path collapses floods
+        if self.raw_log:
+            self.raw_log.write(f"{line}\n")
+
+        store, summary = self.flood_guard.check(line)
+        if summary:
+            self.console_output.append(parse_ansi(summary))
+        if not store:
+            # Same text as the previous line, so it has the same events
+            self.events.dispatch(self._last_plain)
             return
 
-        try:
-            for line in iter(self.process.stdout.readline, ''):
-                if not line:
-                    break
+        # Tokenize ANSI colors once, the ring buffer drops the oldest lines by itself
+        console_line = parse_ansi(line)
+        self._last_plain = console_line.plain
+        self.console_output.append(console_line)
+        self.events.dispatch(console_line.plain)
+
+    def _on_player_join(self, event):
+        self.players[event.data["player"]] = time.time()
+
+    def _on_player_leave(self, event):
+        self.players.pop(event.data["player"], None)
+
+    def _on_ready(self, event):
+        self.ready_time = float(event.data["seconds"].replace(',', '.'))
+        # RCON only starts listening once the server is done loading, one poll thread per run
+        if self._polled_run != self._run_id:
+            self._polled_run = self._run_id
+            threading.Thread(target=self._poll_rcon, args=(self._run_id,), daemon=True).start()
+
+    def _on_plugin_enabled(self, event):
+        self.plugin_versions[event.data["plugin"]] = event.data["version"]
+
+    def _on_tps_warning(self, event):
+        self.last_lag = (int(event.data["ms"]), int(event.data["ticks"]), time.time())
+
+    # RCON
+    def _ensure_rcon_enabled(self):
+        """
+        Turn on RCON with a generated password if it isn't set up yet.
+
+        A server that has RCON off but a password set was turned off on
+        purpose and is left alone, and an existing password is never replaced.
+        """
+        password = self.properties.get("rcon.password")
+        # With a password set, an enable-rcon line is the operator's choice either way
+        if password and self.properties.get("enable-rcon") is not None:
+            return
 
-                with self._console_lock:
-                    self.console_output.append(line.strip())
-                    # Keep console buffer at a reasonable size
-                    if len(self.console_output) > 5000:
-                        self.console_output = self.console_output[-4000:]
+        values = {"enable-rcon": True}
+        if not password:
+            values["rcon.password"] = secrets.token_urlsafe(24)
+        # Keep servers on other ports from all fighting over the default RCON port
+        if self.properties.get_int("rcon.port", 25575) == 25575 and self.get_port() != 25565:
+            values["rcon.port"] = self.get_port() + 10
+        self.properties.update(values)
 
+    def _connect_rcon(self):
+        """Get a connected RCON client, None if RCON isn't available"""
+        if not self._is_running:
+            return None
+        if self.rcon is None:
+            self.rcon = RconClient(
+                self.get_ip() or "127.0.0.1",
+                self.properties.get_int("rcon.port", 25575),
+                self.properties.get("rcon.password", "")
+            )
+        try:
+            self.rcon.connect()
+            self._rcon_error = None
+            return self.rcon
+        except (OSError, RconError) as e:
+            # Only report a new problem, not every poll that runs into the same one
+            if str(e) != self._rcon_error:
+                print(f"RCON unavailable for {self.name}: {str(e)}")
+                self._rcon_error = str(e)
+            return None
+
+    def _poll_rcon(self, run_id):
+        """Refresh the player list and TPS over RCON while the server runs"""
+        while self._is_running and self._run_id == run_id:
+            try:
+                self.refresh_players()
+                self.get_tps()
+            except Exception as e:
+                print(f"Error polling RCON: {str(e)}")
+            time.sleep(self.rcon_poll_interval)
+
+    def rcon_command(self, command:str, timeout:float = 5.0):
+        """Run a command over RCON and return its output, None if RCON isn't available"""
+        rcon = self._connect_rcon()
+        if not rcon:
+            return None
+        try:
+            return rcon.command(command, timeout)
         except Exception as e:
-            print(f"Error reading console: {str(e)}")
-        finally:
-            self._is_running = False
+            print(f"RCON command failed: {str(e)}")
+            return None
+
+    def refresh_players(self):
+        """Replace the console-tracked player list with the server's own, returns the names or None"""
+        response = self.rcon_command("list")
+        match = LIST_PATTERN.search(strip_formatting(response or ""))
+        if not match:
+            return None
+
+        names = [name for name in re.split(r'[,\s]+', match.group("names")) if name]
+        # Keep join times of players we already knew about
+        self.players = {name: self.players.get(name, time.time()) for name in names}
+        self.max_players = int(match.group("max"))
+        return names
+
+    def get_tps(self):
+        """Ask the server for its TPS and record it as a metric, None if unknown"""
+        response = strip_formatting(self.rcon_command(self._tps_command) or "")
+        tps = None
+
+        match = TPS_PATTERN.search(response)
+        if match:
+            tps = float(match.group("tps"))
+        else:
+            match = TICK_QUERY_PATTERN.search(response)
+            if match:
+                # Vanilla 1.20.3+: TPS is capped by the target rate, otherwise 1000 / mspt
+                tps = min(float(match.group("rate")), 1000 / max(float(match.group("mspt")), 0.001))
+            elif response and self._tps_command == "tps":
+                # No /tps (vanilla), try /tick query next time
+                self._tps_command = "tick query"
+
+        if tps is None:
+            return None
+
+        now = time.time()
+        self.tps = round(tps, 2)
+        get_metrics_store(self.name).add("tps", self.tps, now)
+        metrics_db.record(self.name, "tps", now, self.tps)
+        return self.tps
+
+    def save_all(self, flush:bool = True):
+        """Save the world, returns the server's response or None if RCON isn't available"""
+        return self.rcon_command("save-all flush" if flush else "save-all", timeout=60)
+
+    def _server_command(self, command:str):
+        """Run a command over RCON if it's available, otherwise through the console"""
+        if self.rcon_command(command) is None:
+            self.send_command(command)
+
+    def _flush_world(self, timeout:float = 120):
+        """Save the world to disk and wait until the server says it's done, False if it never did"""
+        if self.save_all(flush=True) is not None:
+            return True
 
-    def update_status(self):
+        # Without RCON, wait for the save message on the console
+        saved = threading.Event()
+        on_saved = lambda event: saved.set()
+        self.events.subscribe(events.EVENT_SAVED, on_saved)
         try:
-            server = JavaServer(self.get_ip(), self.get_port())
-            self.status = server.status()
-
-            # Get player count
-            player_count = self.status.players.online
-            self.max_players  = self.status.players.max
-
-            # Get player names (if available - some servers disable this)
-            self.players = []
-            if self.status.players.sample:
-                self.players = [player.name for player in self.status.players.sample]
-
-            return {
-                "online": player_count,
-                "max": self.max_players,
-                "players": self.players,
-                "version": self.status.version.name
-            }
+            self.send_command("save-all flush")
+            return saved.wait(timeout)
+        finally:
+            self.events.unsubscribe(events.EVENT_SAVED, on_saved)
 
-        except Exception as e:
-            print(f"Error querying server: {e}")
+    def update_status(self):
+        """Get the latest cached status snapshot, refreshing it in the background when stale"""
+        if not self._is_running:
             return {"online": 0, "max": 0, "players": []}
-            self.players = []
-            self.max_players = 0
-            self.status = None
+
+        self.status = self.status_poller.snapshot()
+        self.max_players = self.status["max"]
+
+        return {
+            "online": len(self.players),
+            "max": self.max_players,
+            "players": list(self.players),
+            "version": self.status["version"]
+        }
 
     def get_players(self):
-        """Get list of online players using active tracking"""
+        """Get list of online players tracked from the console"""
         if not self._is_running:
             return []
 
-        self.update_status()
-
         return list(self.players)
 
     def get_max_players(self):
         """Get the maximum number of players allowed"""
         if self._is_running:
             self.update_status()
-            return self.max_players
+            if self.max_players:
+                return self.max_players
 
         # Get from server.properties
-        try:
-            prop_file = os.path.join(self.base_dir, "server.properties")
-            if os.path.exists(prop_file):
-                with open(prop_file, 'r') as f:
-                    for line in f:
-                        if line.startswith("max-players="):
-                            return line.split('=')[1].strip()
-        except:
-            return 0
+        return self.properties.get("max-players", 0)
 
     def get_version(self):
-        """Get the server version"""
+        """Get the server version, None until the first ping answered"""
         self.update_status()
-        return self.status.version.name
+        return self.status["version"] if self.status else None
 
     def get_uptime(self):
         """Get server uptime in seconds"""
@@ -280,86 +553,26 @@ class Server:
 
     def get_ip(self):
         """Get the server IP address"""
-        try:
-            prop_file = os.path.join(self.base_dir, "server.properties")
-            if os.path.exists(prop_file):
-                with open(prop_file, 'r') as f:
-                    for line in f:
-                        if line.startswith("server-ip="):
-                            return line.split('=')[1].strip()
-        except:
-            return "127.0.0.1"
+        return self.properties.get("server-ip")
 
     def get_port(self):
         """Get the server port"""
-        try:
-            prop_file = os.path.join(self.base_dir, "server.properties")
-            if os.path.exists(prop_file):
-                with open(prop_file, 'r') as f:
-                    for line in f:
-                        if line.startswith("server-port="):
-                            return int(line.split('=')[1].strip())
-            return 25565  # Default port
-        except:
-            return 25565
+        return self.properties.get_int("server-port", 25565)
 
     def _get_memory_setting(self):
         """Get memory allocation from config or use default"""
         if not hasattr(self, 'max_ram'):
             self.max_ram = 4096
-        try:
-            # Check for custom memory setting
-            config_file = os.path.join(self.base_dir, "server_config.json")
-            if os.path.exists(config_file):
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    if "memory" in config['advanced']:
-                        memory = int(config["advanced"]["memory"])
-                        self.max_ram = memory
-                        return memory
-
-            # Default to 4GB
-        except Exception:
-            ...
+
+        # Check for custom memory setting
+        memory = self.config.memory
+        if memory:
+            self.max_ram = memory
         return self.max_ram
 
     def _start_monitor(self):
         """Start monitoring server resources"""
-        if not self._monitor_thread or not self._monitor_thread.is_alive():
-            self._monitor_thread = threading.Thread(target=self._monitor_resources, daemon=True)
-            self._monitor_thread.start()
-
-    def _monitor_resources(self):
-        """Monitor server CPU and RAM usage"""
-        while self._is_running and self.process:
-            start = time.time()
-            try:
-                if self.process.poll() is None:  # Process still running
-                    proc = psutil.Process(self.process.pid)
-
-                    # Get CPU usage - Fix by calling with interval
-                    self.cpu_usage = proc.cpu_percent(interval=0.5)  # Use interval parameter
-
-                    # Get RAM usage (convert from bytes to MB)
-                    self.ram_usage = proc.memory_info().rss / (1024 * 1024)
-
-                    # Also include child processes (Java may have child processes)
-                    for child in proc.children(recursive=True):
-                        try:
-                            self.cpu_usage += child.cpu_percent(interval=0)
-                            self.ram_usage += child.memory_info().rss / (1024 * 1024)
-                        except Exception:
-                            pass
-
-            except Exception:
-                pass
-
-            time.sleep(max(0,0.5-(time.time()-start)))  # Sleep to maintain loop interval
-
-        try:
-            self.process.terminate()
-        except Exception:
-            ...
+        resource_sampler.register(self)
 
     def get_cpu(self):
         """Get server CPU usage percentage"""
@@ -396,13 +609,18 @@ class Server:
             # Extract plugin info from console (simplified)
             plugin_pattern = re.compile(r'Loading (.+?) \((.+?)\)')
             for line in self.console_output:
-                if 'Loading ' in line and '.jar' in line:
-                    match = plugin_pattern.search(line)
+                if 'Loading ' in line.plain and '.jar' in line.plain:
+                    match = plugin_pattern.search(line.plain)
                     if match:
                         name, version = match.groups()
                         if name in plugins:
                             plugins[name]["version"] = version
 
+            # Versions from "Enabling X vY" lines seen so far
+            for name, version in self.plugin_versions.items():
+                if name in plugins:
+                    plugins[name]["version"] = version
+
         return plugins
 
     def enable_plugin(self, plugin_name):
@@ -428,43 +646,120 @@ class Server:
         return False
 
     # Backup management
-    def create_backup(self, backup_name):
-        """Create a backup of the server"""
+    def is_backing_up(self):
+        """Whether create_backup is running for this Server object"""
+        return self._backup_lock.locked()
+
+    def _backup_store(self):
+        # "dedup" treats region files like any other file
+        return BackupStore(
+            os.path.join(self.base_dir, "backups"),
+            compression_level=self.config.get("backup_compression_level", 6),
+            region_aware=self.config.get("backup_mode", "region") != "dedup",
+            threads=self.config.get("backup_threads")
+        )
+
+    def create_backup(self, backup_name, low_priority=False):
+        """Create a backup of the server, low_priority compresses at idle CPU and I/O priority after the snapshot"""
         if not backup_name:
             backup_name = f"backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        if not valid_backup_name(backup_name):
+            print(f"Invalid backup name: {backup_name!r}")
+            return False
 
         backups_dir = os.path.join(self.base_dir, "backups")
         if not os.path.exists(backups_dir):
             os.makedirs(backups_dir)
 
-        backup_path = os.path.join(backups_dir, backup_name)
+        # Only the work after the snapshot, saving is already back on by then
+        run = run_low_priority if low_priority else lambda func, *args, **kwargs: func(*args, **kwargs)
 
-        # Create a zip file of the server directory, excluding backups folder
+        with self._backup_lock:
+            started = time.perf_counter()
+            snapshot_dir = os.path.join(backups_dir, f".snapshot-{secrets.token_hex(8)}")
+            try:
+                # "region" and "dedup" only store what changed since the last backup, "zip" makes a standalone archive
+                if self.config.get("backup_mode", "region") in ("region", "dedup"):
+                    store = self._backup_store()
+                    previous, _ = store.previous_files()
+                    # Files the store will reuse anyway don't need to be in the snapshot
+                    snapshot_time = time.time()
+                    files, pause = self._snapshot(snapshot_dir, lambda rel_path, stat: unchanged(previous.get(rel_path), stat))
+                    manifest = run(store.create, backup_name, self.base_dir, files=files, started=snapshot_time)
+                    size, written = manifest["size"], manifest["added"]
+                else:
+                    files, pause = self._snapshot(snapshot_dir)
+                    size, written = run(self._create_zip_backup, os.path.join(backups_dir, f"{backup_name}.zip"), files)
+            except Exception as e:
+                print(f"Backup failed: {str(e)}")
+                traceback.print_exc()
+                return False
+            finally:
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+        # Throughput over the whole server directory, kept so slow disks or settings show up
+        seconds = max(time.perf_counter() - started, 0.001)
+        self.last_backup = {
+            "name": backup_name,
+            "size": size,
+            "written": written,
+            "seconds": seconds,
+            "pause": pause,  # Seconds the server had saving turned off
+            "throughput": size / 1024 / 1024 / seconds  # MB/s
+        }
+        metrics_db.record(self.name, "backup_throughput", time.time(), self.last_backup["throughput"])
+        metrics_db.record(self.name, "backup_pause", time.time(), pause)
+        print(
+            f"Backup {backup_name}: {size} bytes in {seconds:.1f} s ({self.last_backup['throughput']:.1f} MB/s), "
+            f"{written} bytes written, saving paused for {pause * 1000:.0f} ms"
+        )
+        return True
+
+    def _snapshot(self, snapshot_dir, skip=None):
+        """
+        Capture the server directory into snapshot_dir, the final pass with saving turned off.
+
+        Files are first copied while the server keeps saving. Then saving is
+        turned off, the world is flushed so no region file is half written,
+        and only files that changed since the first pass are copied again
+        before saving goes back on. With reflinks or hard links both passes
+        take milliseconds. With plain copies the first pass takes as long as
+        copying the tree, but the pause only covers what the flush wrote.
+
+        Returns:
+            tuple: snapshot_files() list, seconds saving was off
+        """
+        started = time.perf_counter()
+        first_pass = snapshot_files(self.base_dir, snapshot_dir, ("backups",), skip)
+        copied = time.perf_counter() - started
+        if not self._is_running:
+            return first_pass[0], 0
+
+        paused = time.perf_counter()
+        self._server_command("save-off")
         try:
-            # Create the zip file
-            with zipfile.ZipFile(f"{backup_path}.zip", 'w', zipfile.ZIP_DEFLATED) as zipf:
-                # Walk through all files and directories in the server directory
-                for root, dirs, files in os.walk(self.base_dir):
-                    # Skip the backups directory
-                    if os.path.basename(root) == "backups" and os.path.dirname(root) == self.base_dir:
-                        continue
-
-                    # Add files to zip
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        # Get relative path (for zip structure)
-                        rel_path = os.path.relpath(file_path, self.base_dir)
-                        zipf.write(file_path, rel_path)
-
-                    # Skip backup subdirs if we encounter them
-                    if "backups" in dirs:
-                        dirs.remove("backups")
+            if not self._flush_world():
+                print("The server didn't confirm the save, the backup may contain unsaved chunks")
+            files, methods, _ = snapshot_files(self.base_dir, snapshot_dir, ("backups",), skip, first_pass)
+        finally:
+            self._server_command("save-on")
+        pause = time.perf_counter() - paused
 
-            return True
-        except Exception as e:
-            print(f"Backup failed: {str(e)}")
-            traceback.print_exc()
-            return False
+        print(
+            f"Snapshot of {self.name}: first pass {copied:.1f} s ({_describe_methods(first_pass[1])}), "
+            f"saving paused for {pause * 1000:.0f} ms ({_describe_methods(methods)})"
+        )
+        return files, pause
+
+    def _create_zip_backup(self, zip_path, files=None):
+        """Zip the server directory except backups/ (or the given snapshot files) on all cores, returns (bytes in, bytes out)"""
+        threads = self.config.get("backup_threads")
+        level = self.config.get("backup_compression_level", 6)
+
+        with ParallelZipWriter(zip_path, threads, level) as writer:
+            for file_path, rel_path, _ in walk_files(self.base_dir, ("backups",)) if files is None else files:
+                writer.write(file_path, rel_path)
+        return writer.bytes_in, writer.bytes_out
 
     def get_backups(self):
         """Get list of available backups"""
@@ -482,22 +777,26 @@ class Server:
                     "name": backup_name,
                     "path": backup_file,
                     "size": stat.st_size,
-                    "timestamp": stat.st_mtime
+                    "timestamp": stat.st_mtime,
+                    "type": "zip"
                 })
             except:
                 pass
 
-        return backups
+        return backups + self._backup_store().list()
 
     def restore_backup(self, backup_name):
         """Restore server from a backup"""
+        if not valid_backup_name(backup_name):
+            raise ValueError(f"Invalid backup name: {backup_name!r}")
         if self._is_running:
             raise ValueError("Server must be stopped before restoring a backup")
 
         backups_dir = os.path.join(self.base_dir, "backups")
         backup_path = os.path.join(backups_dir, f"{backup_name}.zip")
+        store = self._backup_store()
 
-        if not os.path.exists(backup_path):
+        if not os.path.exists(backup_path) and not store.exists(backup_name):
             raise FileNotFoundError(f"Backup {backup_name} not found")
 
         try:
@@ -508,7 +807,10 @@ class Server:
             os.makedirs(temp_dir)
 
             # Extract backup
-            shutil.unpack_archive(backup_path, temp_dir)
+            if os.path.exists(backup_path):
+                shutil.unpack_archive(backup_path, temp_dir)
+            else:
+                store.restore(backup_name, temp_dir)
 
             # Remove current server files (except backups)
             for item in os.listdir(self.base_dir):
@@ -537,6 +839,10 @@ class Server:
 
     def delete_backup(self, backup_name):
         """Delete a backup"""
+        if not valid_backup_name(backup_name):
+            print(f"Invalid backup name: {backup_name!r}")
+            return False
+
         backups_dir = os.path.join(self.base_dir, "backups")
         backup_path = os.path.join(backups_dir, f"{backup_name}.zip")
 
@@ -546,49 +852,35 @@ class Server:
                 return True
             except Exception as e:
                 print(f"Failed to delete backup: {str(e)}")
+            return False
 
-        return False
-
-    def set_backup_schedule(self, enabled, interval, max_backups):
-        """Save backup schedule settings"""
-        config_file = os.path.join(self.base_dir, "server_config.json")
-
-        config = {}
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-            except:
-                pass
+        try:
+            return self._backup_store().delete(backup_name)
+        except Exception as e:
+            print(f"Failed to delete backup: {str(e)}")
+            return False
 
-        config["backup_schedule"] = {
+    def set_backup_schedule(self, enabled, interval, max_backups, retention=None):
+        """Save backup schedule settings, retention like {"hourly": 24, "daily": 7, "weekly": 4}"""
+        schedule = {
             "enabled": enabled,
             "interval": interval,
             "max_backups": max_backups
         }
-
-        try:
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Failed to save backup schedule: {str(e)}")
-            return False
+        # Keep the saved retention when the caller doesn't set one
+        retention = retention if retention is not None else self.config.backup_schedule.get("retention")
+        if retention:
+            schedule["retention"] = retention
+        self.config.set("backup_schedule", schedule)
+        return True
 
     def schedule_next_backup(self):
-        """Schedule the next backup (this would be implemented differently in production)"""
-        pass  # This would be implemented with a scheduler in a real system    def update_settings(self, general=None, world=None, advanced=None):
-        """Update server settings"""
-        # This is a simplified implementation
-        config_file = os.path.join(self.base_dir, "server_config.json")
+        """Put this server on the shared backup scheduler, or take it off if its schedule is disabled"""
+        backup_scheduler.schedule(self)
 
+    def update_settings(self, general=None, world=None, advanced=None):
+        """Update server settings"""
         config = {}
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-            except:
-                pass
 
         # Update configuration
         if general:
@@ -604,10 +896,9 @@ class Server:
             if "java_path" in advanced:
                 config["java_path"] = advanced["java_path"]
 
-        # Save configuration
+        # Save configuration, the store coalesces the write
         try:
-            with open(config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            self.config.update(config)
 
             # Update server.properties file
             self._update_server_properties(config)
@@ -618,20 +909,7 @@ class Server:
 
     def _update_server_properties(self, config):
         """Update server.properties file with new settings"""
-        prop_file = os.path.join(self.base_dir, "server.properties")
-
         props = {}
-        # Read existing properties
-        if os.path.exists(prop_file):
-            try:
-                with open(prop_file, 'r') as f:
-                    for line in f:
-                        line = line.strip()
-                        if line and not line.startswith('#') and '=' in line:
-                            key, value = line.split('=', 1)
-                            props[key.strip()] = value.strip()
-            except:
-                pass
 
         # Update with new values
         if "general" in config:
@@ -640,18 +918,16 @@ class Server:
 
         if "world" in config:
             for key, value in config["world"].items():
-                props[key] = str(value).lower() if isinstance(value, bool) else str(value)
+                props[key] = value
 
         if "advanced" in config:
             for key, value in config["advanced"].items():
                 if key in ["online-mode", "enable-command-block", "pvp", "force-gamemode", "allow-flight"]:
-                    props[key] = str(value).lower() if isinstance(value, bool) else str(value)
+                    props[key] = value
 
-        # Write back to file
+        # Write back to file, keeping comments and the order of existing keys
         try:
-            with open(prop_file, 'w') as f:
-                for key, value in props.items():
-                    f.write(f"{key}={value}\n")
+            self.properties.update(props)
         except Exception as e:
             print(f"Failed to update server.properties: {str(e)}")
 
@@ -659,17 +935,8 @@ class Server:
     def save_optimization_settings(self, settings):
         """Save optimization settings to server config and apply to config files"""
         try:
-            # Load current config
-            config_path = os.path.join(self.base_dir, "server_config.json")
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-
-            # Update optimization settings
-            config["optimizations"] = settings
-
-            # Save updated config
-            with open(config_path, 'w') as f:
-                json.dump(config, f, indent=2)
+            # Update optimization settings, written together with any other pending change
+            self.config.set("optimizations", settings)
 
             # Apply settings to server configuration files
             self._apply_optimization_settings(settings)
@@ -691,19 +958,9 @@ class Server:
 
         # Apply vanilla settings to server.properties (regular properties file)
         if "vanilla" in settings:
-            props_file = os.path.join(self.base_dir, "server.properties")
-            if os.path.exists(props_file):
-                # Properties files aren't YAML, so use the existing approach
-                with open(props_file, 'r') as f:
-                    content = f.read()
-
-                for key, value in settings["vanilla"].items():
-                    pattern = re.compile(f"{key}=.*(\r?\n|$)")
-                    replacement = f"{key}={value}\\1"
-                    content = re.sub(pattern, replacement, content)
-
-                with open(props_file, 'w') as f:
-                    f.write(content)
+            if self.properties.exists():
+                # Properties files aren't YAML, use the cached properties parser
+                self.properties.update(settings["vanilla"])
 
         # Apply bukkit settings to bukkit.yml using YAML parser
         if "bukkit" in settings:
@@ -847,16 +1104,9 @@ class Server:
 
     def get_optimization_settings(self):
         """Get current optimization settings from server config"""
-        config_path = os.path.join(self.base_dir, "server_config.json")
-        if os.path.exists(config_path):
-            try:
-                with open(config_path, 'r') as f:
-                    config = json.load(f)
-
-                if "optimizations" in config:
-                    return config["optimizations"]
-            except:
-                pass
+        optimizations = self.config.optimizations
+        if optimizations:
+            return optimizations
 
         return {
             "vanilla": {
@@ -873,15 +1123,9 @@ class Server:
     def _find_java_executable(self):
         """Find the Java executable path on the system"""
         # Check if a custom Java path is specified in the server config
-        config_file = os.path.join(self.base_dir, "server_config.json")
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r') as f:
-                    config = json.load(f)
-                    if "java_path" in config and os.path.exists(config["java_path"]):
-                        return config["java_path"]
-            except Exception as e:
-                print(f"Error reading server config: {str(e)}")
+        java_path = self.config.java_path
+        if java_path and os.path.exists(java_path):
+            return java_path
 
         # Try the system PATH first
         try:
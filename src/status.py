@@ -0,0 +1,156 @@
+import threading
+import asyncio
+import time
+
+
+def empty_status():
+    """Status snapshot used before the first ping or when the server is unreachable"""
+    return {
+        "online": 0,
+        "max": 0,
+        "players": [],
+        "version": None,
+        "latency": None,
+        "timestamp": 0
+    }
+
+
+def snapshot_from_status(status, latency=None):
+    """Turn an mcstatus response into a status snapshot"""
+    # Get player names (if available - some servers disable this)
+    players = []
+    if status.players.sample:
+        players = [player.name for player in status.players.sample]
+
+    return {
+        "online": status.players.online,
+        "max": status.players.max,
+        "players": players,
+        "version": status.version.name,
+        "latency": latency,
+        "timestamp": time.time()
+    }
+
+
+class StatusCache:
+    """Latest status snapshot of every server, shared by all pollers"""
+
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the latest snapshot for a server or None if it was never pinged"""
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def put(self, key, snapshot):
+        """Store a new snapshot for a server"""
+        with self._lock:
+            self._snapshots[key] = snapshot
+
+    def clear(self, key):
+        """Forget the snapshot of a server (e.g. after it stopped)"""
+        with self._lock:
+            self._snapshots.pop(key, None)
+
+
+status_cache = StatusCache()
+
+
+class PingEngine:
+    """Run Server List Pings for any number of servers concurrently on one asyncio loop"""
+
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self):
+        """Start the event loop thread on first use"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+            return self._loop
+
+    async def ping(self, key, host, port, timeout=3):
+        """Ping one server, store the result in the status cache and return it"""
+        # mcstatus (and the dnspython it pulls in) is only loaded once a server is actually pinged
+        from mcstatus import JavaServer
+
+        start = time.perf_counter()
+        try:
+            server = JavaServer(host or "127.0.0.1", int(port), timeout=timeout)
+            status = await asyncio.wait_for(server.async_status(), timeout)
+            # Round trip of the whole handshake + status exchange in ms
+            snapshot = snapshot_from_status(status, (time.perf_counter() - start) * 1000)
+        except Exception as e:
+            print(f"Error querying server {key}: {e}")
+            # Still stamp it so a dead server is retried once per ttl, not on every read
+            snapshot = empty_status()
+            snapshot["timestamp"] = time.time()
+
+        status_cache.put(key, snapshot)
+        return snapshot
+
+    async def ping_many(self, targets, timeout=3):
+        """Ping (key, host, port) targets concurrently, returns {key: snapshot}"""
+        snapshots = await asyncio.gather(
+            *(self.ping(key, host, port, timeout) for key, host, port in targets)
+        )
+        return {target[0]: snapshot for target, snapshot in zip(targets, snapshots)}
+
+    def submit(self, key, host, port, timeout=3):
+        """Schedule a ping from any thread, returns a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(self.ping(key, host, port, timeout), self._get_loop())
+
+    def poll_all(self, servers, timeout=3):
+        """Ping every given Server at once and wait for all of them, takes about one timeout at most"""
+        targets = [(server.name, server.get_ip(), server.get_port()) for server in servers]
+        future = asyncio.run_coroutine_threadsafe(self.ping_many(targets, timeout), self._get_loop())
+        return future.result(timeout + 1)
+
+
+ping_engine = PingEngine()
+
+
+class StatusPoller:
+    """
+    Serve status snapshots of one server from the shared cache.
+
+    Reads never touch the network. Once a snapshot is older than ttl seconds
+    the stale one is still returned while a single ping on the shared
+    PingEngine refreshes it.
+    """
+
+    def __init__(self, server, ttl=5.0, timeout=3):
+        self.server = server
+        self.ttl = ttl
+        self.timeout = timeout
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        """Get the cached snapshot, revalidating it in the background if it is stale"""
+        snapshot = status_cache.get(self.server.name)
+        if snapshot is None or time.time() - snapshot["timestamp"] > self.ttl:
+            self.refresh()
+        return snapshot or empty_status()
+
+    def refresh(self):
+        """Queue a ping on the shared engine unless one is already in flight"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        try:
+            future = ping_engine.submit(self.server.name, self.server.get_ip(), self.server.get_port(), self.timeout)
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(self._done)
+
+    def _done(self, future=None):
+        with self._lock:
+            self._refreshing = False